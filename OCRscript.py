@@ -22,7 +22,6 @@ import json
 import subprocess
 import requests
 from alive_progress import alive_bar
-import csv
 import scipy
 import nltk
 import torch
@@ -34,6 +33,10 @@ from random import randint
 from downloadscript import GetIndices
 from downloadscript import StoreIndex
 from downloadscript import ResetIndex
+from downloadscript import FirmDone
+import runstate
+import docstore
+import copyfoundfirms
 
 extracted_text_dir = "./extracted_text"
 
@@ -223,11 +226,19 @@ def FormatResult(result):
 
 def CreatePathDict():
     """
-    Create a dictionary using files in matched_folders and metadata matches
+    Create a dictionary using files in matched_folders and metadata matches,
+    or metadata rows of found firms straight from their zips when docstore.from_zips
     Return: dictionary of format- path(key): (gvkey,company name,year) (value)
     """
     path_dict = {}
 
+    if docstore.from_zips:
+        found_gvkeys = set(copyfoundfirms.CreateGVKeyList())
+        for row in runstate.Rows("metadata"):
+            if row[1] in found_gvkeys and row[7] not in path_dict:
+                path_dict[row[7]] = (row[1], row[2], row[4])
+        return path_dict
+
     matched_dir = os.path.join(os.getcwd(), "matched_folders")
 
     dirlist=os.listdir(matched_dir)
@@ -241,15 +252,10 @@ def CreatePathDict():
             for file in os.listdir(folder_path):
                 file_path = os.path.join(folder_path, file)
 
-                with open("metadata.csv", "r") as csvfile:
-                    reader = csv.reader(csvfile)
-                    next(reader)  # skip header
-
-                    for row in reader:
-
-                        if row[0] == file:  # check for a file path match
-                            path_dict[file_path] = (row[1], row[2], row[4])
-                            break
+                # First metadata row for this file name, through the filename index
+                rows = runstate.Select("metadata", filename=file)
+                if rows:
+                    path_dict[file_path] = (rows[0][1], rows[0][2], rows[0][4])
             bar()
 
     return path_dict
@@ -277,26 +283,28 @@ def WriteToExtractedText(formatted_text, val):
 
 
 def WriteComplexity(val, complexity):
-    # Check if file exists
-    temp = [str(val[0]), str(val[1]), str(val[2])]
+    """
+    Appends a complexity to the complexities table and rewrites complexities.csv
+
+    val -- tuple of (gvkey,company name, mergent year)
+    complexity -- float from GetICGaugeScore
+    Return: void or 0 if val has already been written
+    """
+    # if val has been written, we will not change
+    if runstate.Select("complexities", gvkey=val[0], name_hh=val[1], year=val[2]):
+        return 0
 
-    with open("./complexities.csv", "r", newline="") as file:
-        reader = csv.reader(file)
-        for row in reader:
-            if row[:-1] == temp:  # if val has been written, we will not change
-                return 0
-    # If file doesnt exist, append
-    with open("./complexities.csv", "a", newline="") as file:
-        writer = csv.writer(file)
-        writer.writerow(temp.append(str(complexity)))
+    runstate.Insert("complexities", [val[0], val[1], val[2], complexity])
+    runstate.Commit()
+    runstate.ExportCsv("complexities")
 
 
 def main():
 
     server, model = OCRSetup("linknet_resnet18")
     path_dict = CreatePathDict()
-    ResetIndex(True)
-    starting_index, ending_index = GetIndices(len(path_dict))
+    ResetIndex(True, "ocr")
+    starting_index, ending_index = GetIndices(len(path_dict), "ocr")
 
 
     with alive_bar(len(path_dict)) as bar:
@@ -307,8 +315,12 @@ def main():
         for key, val in path_dict.items():
 
             bar.text("OCRing and gathering complexities")
-            if (curr_firm >= starting_index) and (curr_firm <= ending_index):
-                doc = DocumentFile.from_pdf(key)
+            if (
+                (curr_firm >= starting_index)
+                and (curr_firm <= ending_index)
+                and not FirmDone(curr_firm, "ocr")
+            ):
+                doc = DocumentFile.from_pdf(docstore.Source(key))
                 result = model(doc)
                 formatted_text = FormatResult(result)
 
@@ -317,7 +329,7 @@ def main():
                 )  # write_complete 0 or 1 depending if file already parsed
                 if write_complete == 1:
                     WriteComplexity(val, GetICGaugeScore(formatted_text))
-                StoreIndex(curr_firm)
+                StoreIndex(curr_firm, namespace="ocr")
 
             curr_firm += 1
             bar()
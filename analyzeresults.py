@@ -1,10 +1,11 @@
 """
-Creates statistics based off of matching.csv
+Creates statistics based off of matching.csv, read through the run state store
 
 Evan Fioritto
 """
 
 import csv
+import runstate
 
 
 def WriteMissing():
@@ -31,18 +32,15 @@ def WriteMissing():
             ]
         )
 
-        with open("matching.csv", "r") as csvfile2:
-            reader = csv.reader(csvfile2)
+        for row in runstate.Rows("matching"):
 
-            for row in reader:
-
-                if row[4] == "NA":  # no mergent result
-                    writer.writerow([row[0], row[1], row[2], row[3], "NA"])
-                    missing_count += 1
-                elif row[5] == "N":  # no matching year
-                    writer.writerow([row[0], row[1], row[2], row[3], "N"])
-                    gap_count += 1
-                    missing_count += 1
+            if row[4] == "NA":  # no mergent result
+                writer.writerow([row[0], row[1], row[2], row[3], "NA"])
+                missing_count += 1
+            elif row[5] == "N":  # no matching year
+                writer.writerow([row[0], row[1], row[2], row[3], "N"])
+                gap_count += 1
+                missing_count += 1
 
     return missing_count, gap_count
 
@@ -66,13 +64,10 @@ def WriteFound():
                 ["GVKey", "Company Name", "Year", "Data Date", "File Count"]
             )
 
-            with open("matching.csv", "r") as csvfile2:
-                reader = csv.reader(csvfile2)
-
-                for row in reader:
-                    if row[4] == "OK" and row[5] == "Y" and int(row[6]) > 0:
-                        writer.writerow([row[0], row[1], row[2], row[3], row[6]])
-                        found_count += 1
+            for row in runstate.Rows("matching"):
+                if row[4] == "OK" and row[5] == "Y" and int(row[6]) > 0:
+                    writer.writerow([row[0], row[1], row[2], row[3], row[6]])
+                    found_count += 1
 
     return found_count
 
@@ -86,17 +81,13 @@ def CreateEntryDict():
     """
     entry_dict = {}
 
-    with open("matching.csv", "r") as csvfile2:
-        reader = csv.reader(csvfile2)
-        next(reader)
-
-        for row in reader:
+    for row in runstate.Rows("matching"):
 
-            if row[0] in entry_dict.keys():
-                entry_dict[row[0]] += 1
+        if row[0] in entry_dict.keys():
+            entry_dict[row[0]] += 1
 
-            else:
-                entry_dict[row[0]] = 1
+        else:
+            entry_dict[row[0]] = 1
 
     return entry_dict
 
@@ -110,22 +101,18 @@ def CreateVerifiedEntryDict():
     """
     entry_dict = {}
 
-    with open("matching.csv", "r") as csvfile2:
-        reader = csv.reader(csvfile2)
-        next(reader)
-
-        for row in reader:
+    for row in runstate.Rows("matching"):
 
-            if row[5] == "Y" and int(row[6]) > 0:
+        if row[5] == "Y" and int(row[6]) > 0:
 
-                if row[0] in entry_dict.keys():
-                    entry_dict[row[0]] += 1
+            if row[0] in entry_dict.keys():
+                entry_dict[row[0]] += 1
 
-                else:
-                    entry_dict[row[0]] = 1
+            else:
+                entry_dict[row[0]] = 1
 
-            elif row[0] not in entry_dict.keys() and row[4] == "NA":
-                entry_dict[row[0]] = 0
+        elif row[0] not in entry_dict.keys() and row[4] == "NA":
+            entry_dict[row[0]] = 0
 
     print(entry_dict)
     return entry_dict
@@ -0,0 +1,181 @@
+"""
+Append-only checkpoint journal, replacing lastindex.txt
+
+Each script keeps its own journal under /checkpoints ("download" for downloadscript.py, "ocr" for
+OCRscript.py). Every completed firm and every completed results page is appended as one csv row and
+synced to disk, so a crash mid-firm resumes at the first unfinished page. The journal is replayed
+into sets once when opened, after which every lookup is O(1).
+
+Records:
+["F", firm index, gvkey] firm complete
+["P", gvkey, search kind, page] page complete, search kind is "ANR" or "ALL"
+["I", firm index] every firm up to index complete, imported from lastindex.txt
+["C", gvkey] page records of gvkey cleared, so its searches are walked again from page 1
+["R"] reset, everything before it is ignored
+"""
+
+import csv
+import os
+import threading
+
+journal_dir = "checkpoints"
+legacy_path = "lastindex.txt"
+
+
+class Journal:
+    """
+    Completion state of one script, backed by its journal file
+
+    namespace -- journal name, one per script
+    directory -- folder holding journal files
+    """
+
+    def __init__(self, namespace, directory=None):
+        directory = directory or journal_dir
+        os.makedirs(directory, exist_ok=True)
+        self.path = os.path.join(directory, namespace + ".journal")
+        self.lock = threading.Lock()
+        self.Clear()
+
+        is_new = not os.path.exists(self.path)
+        if not is_new:
+            with open(self.path, "r", newline="") as file:
+                for record in csv.reader(file):
+                    if record:
+                        self.Apply(record)
+
+        self.file = open(self.path, "a", newline="")
+        self.writer = csv.writer(self.file)
+
+        # First run after lastindex.txt, carry its index over to the download journal
+        if is_new and namespace == "download" and os.path.exists(legacy_path):
+            with open(legacy_path, "r") as file:
+                legacy_index = file.read().strip()
+            if legacy_index.isnumeric() and int(legacy_index) > 0:
+                self.Append(["I", legacy_index])
+
+    def Clear(self):
+        """
+        Forgets all completion state in memory
+
+        Return: void
+        """
+        self.floor = 0  # every firm up to floor is complete
+        self.firms = set()  # complete firms above floor
+        self.pages = {}  # (gvkey, search kind): last complete page
+
+    def Apply(self, record):
+        """
+        Updates state in memory with one journal record
+
+        record -- list of strings, see module docstring
+        Return: void
+        """
+        kind = record[0]
+        if kind == "F":
+            self.firms.add(int(record[1]))
+            for search_kind in ["ANR", "ALL"]:
+                self.pages.pop((record[2], search_kind), None)
+        elif kind == "P":
+            page_key = (record[1], record[2])
+            self.pages[page_key] = max(self.pages.get(page_key, 0), int(record[3]))
+        elif kind == "C":
+            for page_key in [page_key for page_key in self.pages if page_key[0] == record[1]]:
+                del self.pages[page_key]
+        elif kind == "I":
+            self.floor = max(self.floor, int(record[1]))
+            self.firms = {index for index in self.firms if index > self.floor}
+        elif kind == "R":
+            self.Clear()
+
+        # Fold firms completed in order into floor, so firms only holds out of order completions
+        while self.floor + 1 in self.firms:
+            self.floor += 1
+            self.firms.remove(self.floor)
+
+    def Append(self, record):
+        """
+        Writes a record to the journal, synced to disk before returning, and applies it
+
+        record -- list of values
+        Return: void
+        """
+        record = [str(value) for value in record]
+        with self.lock:
+            self.writer.writerow(record)
+            self.file.flush()
+            os.fsync(self.file.fileno())
+            self.Apply(record)
+
+    def CompleteFirm(self, index, key=""):
+        """
+        index -- int firm index
+        key -- company key, drops the firm's page records
+        Return: void
+        """
+        self.Append(["F", index, key])
+
+    def FirmDone(self, index):
+        """
+        Return: bool, true if firm index is complete
+        """
+        return index <= self.floor or index in self.firms
+
+    def CompletePage(self, key, search_kind, page):
+        """
+        key -- company key
+        search_kind -- "ANR" or "ALL"
+        page -- int results page
+        Return: void
+        """
+        self.Append(["P", key, search_kind, page])
+
+    def NextPage(self, key, search_kind):
+        """
+        Return: int, first results page of a firm's search not yet complete
+        """
+        return self.pages.get((key, search_kind), 0) + 1
+
+    def ForgetPages(self, key):
+        """
+        Marks every page of a firm's searches as not done
+
+        key -- company key
+        Return: void
+        """
+        self.Append(["C", key])
+
+    def LastIndex(self):
+        """
+        Return: int, highest firm index with every earlier firm complete
+        """
+        return self.floor
+
+    def Reset(self):
+        """
+        Marks everything before as not done
+
+        Return: void
+        """
+        self.Append(["R"])
+
+    def Close(self):
+        """
+        Return: void
+        """
+        with self.lock:
+            self.file.close()
+
+
+journals = {}  # Open Journal objects keyed by namespace
+journals_lock = threading.Lock()
+
+
+def Open(namespace):
+    """
+    Return: the Journal for namespace, opened on first use
+    """
+    with journals_lock:
+        if namespace not in journals:
+            journals[namespace] = Journal(namespace)
+        return journals[namespace]
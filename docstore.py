@@ -0,0 +1,127 @@
+"""
+Access to downloaded PDFs without extracting them
+
+With from_zips = True every downloaded file is read straight out of its zip in /zips instead of from
+/folders. A file is named by a path inside its zip, e.g. zips/001004_AAR-CORP_2001_2003_1.zip/123_4.pdf,
+which is what metadata stores as its path. Members stored without compression, as Mergent's bulk zips
+are, are read from a memory map of the zip, others are decompressed in memory; nothing is written to disk.
+With from_zips = False paths are plain files under /folders, as unzipped by verifyscript.py.
+"""
+
+import mmap
+import os
+import struct
+import threading
+import zipfile
+
+from_zips = False  # read files from /zips instead of the folders unzipped into /folders
+zip_directory = "./zips"
+folder_directory = "./folders"
+
+directories = {}  # zip path: {member name: ZipInfo}, each central directory is read once
+directories_lock = threading.Lock()
+
+
+def Folders():
+    """
+    Return: list of (folder name, folder path), one per zip, named as the zip without ".zip"
+    """
+    if not from_zips:
+        return [
+            (name, os.path.join(folder_directory, name))
+            for name in os.listdir(folder_directory)
+        ]
+    return [
+        (name[:-4], os.path.join(zip_directory, name))
+        for name in os.listdir(zip_directory)
+        if name.endswith(".zip")
+    ]
+
+
+def Directory(zip_path):
+    """
+    Return: dict of member name: ZipInfo of a zip, empty if the zip cannot be read
+    """
+    with directories_lock:
+        if zip_path not in directories:
+            try:
+                with zipfile.ZipFile(zip_path, "r") as zip_ref:
+                    directories[zip_path] = {
+                        info.filename: info for info in zip_ref.infolist()
+                    }
+            except (zipfile.BadZipFile, OSError):
+                directories[zip_path] = {}
+        return directories[zip_path]
+
+
+def Files(folder_path):
+    """
+    folder_path -- path from Folders
+    Return: list of file names in the folder
+    """
+    if not from_zips:
+        return os.listdir(folder_path)
+    return list(Directory(folder_path))
+
+
+def Resolve(path):
+    """
+    Splits a path inside a zip into the zip and its member
+
+    path -- file path
+    Return: tuple (zip path, member name), None for a plain file
+    """
+    zip_path, member = os.path.split(path)
+    if zip_path.endswith(".zip") and os.path.isfile(zip_path):
+        return zip_path, member
+    return None
+
+
+def ReadMember(zip_path, member):
+    """
+    Reads one file out of a zip, from a memory map of the zip if the file is stored uncompressed
+
+    Return: bytes
+    """
+    info = Directory(zip_path).get(member)
+    if info is None:
+        raise KeyError(member + " not in " + zip_path)
+
+    if info.compress_type == zipfile.ZIP_STORED and not info.flag_bits & 0x1:
+        with open(zip_path, "rb") as file:
+            with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as view:
+                # Data follows the 30 byte local header, its file name and its extra field
+                header = view[info.header_offset : info.header_offset + 30]
+                if header[:4] == b"PK\x03\x04":
+                    name_length, extra_length = struct.unpack("<HH", header[26:30])
+                    start = info.header_offset + 30 + name_length + extra_length
+                    return view[start : start + info.compress_size]
+
+    with zipfile.ZipFile(zip_path, "r") as zip_ref:
+        return zip_ref.read(member)
+
+
+def Source(path):
+    """
+    path -- file path, plain or inside a zip
+    Return: path for a plain file, bytes of the file for one inside a zip
+    """
+    resolved = Resolve(path)
+    if resolved is None:
+        return path
+    return ReadMember(*resolved)
+
+
+def Open(path):
+    """
+    Opens a PDF with PyMuPDF, from memory if it is inside a zip
+
+    path -- file path, plain or inside a zip
+    Return: fitz Document
+    """
+    import fitz  # only the stages reading PDFs need PyMuPDF
+
+    source = Source(path)
+    if isinstance(source, str):
+        return fitz.open(source)
+    return fitz.open(stream=source, filetype="pdf")
@@ -12,24 +12,41 @@ pip install selenium
 pip install alive-progress
 """
 
+import argparse
+import atexit
 import csv
+import json
 import time
 import os
-import glob
 import os.path
+import threading
 import zipfile
+import runstate
+import checkpoint
+import zipcheck
+import phasetrace
+import downloadwatcher
+import httptransport
+import requests
 from selenium import webdriver
 from selenium.common.exceptions import TimeoutException
 from selenium.common.exceptions import ElementClickInterceptedException
 from selenium.common.exceptions import StaleElementReferenceException
+from selenium.common.exceptions import WebDriverException
 from selenium.webdriver.common.keys import Keys
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from alive_progress import alive_bar
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from getpass import getpass
 
 
+missing_csv = "ARC_HH_OK_AR_missing.csv"
+firm_list_path = "firms.csv"
+
+
 def GetDict():
     """
     Stores company data in return dictionary as as {'Global Company Key':'Company Name'}
@@ -39,7 +56,7 @@ def GetDict():
     ret = {}
 
     # Populate dictionary
-    with open("ARC_HH_OK_AR_missing.csv") as csvfile:
+    with open(missing_csv) as csvfile:
         reader = csv.reader(csvfile)
 
         next(reader)  # skip titles
@@ -51,6 +68,86 @@ def GetDict():
     return ret
 
 
+def GetFirmList():
+    """
+    Returns the unique firms in the order GetDict iterates them, from firms.csv.
+    firms.csv is rebuilt whenever ARC_HH_OK_AR_missing.csv is newer, so firm indices stay
+    the same on every machine given the same missing csv.
+
+    Return: list of (Global Company Key, Company Name), firm index i at position i - 1
+    """
+    if os.path.exists(firm_list_path) and os.path.getmtime(
+        firm_list_path
+    ) >= os.path.getmtime(missing_csv):
+        with open(firm_list_path, "r", newline="") as file:
+            reader = csv.reader(file)
+            next(reader)  # skip titles
+            return [(row[1], row[2]) for row in reader]
+
+    firms = list(GetDict().items())
+    temp_path = firm_list_path + ".tmp"
+    with open(temp_path, "w", newline="") as file:
+        writer = csv.writer(file)
+        writer.writerow(["Firm Index", "Global Company Key", "Company Name"])
+        writer.writerows(
+            [index, key, val] for index, (key, val) in enumerate(firms, 1)
+        )
+    os.replace(temp_path, firm_list_path)
+    return firms
+
+
+def ShardRange(starting_index, ending_index, shard, shard_count):
+    """
+    Splits a firm range into shard_count contiguous blocks of near equal size
+
+    shard -- 1 based shard number
+    Return: two ints, first and last firm index of the shard, first > last if the shard is empty
+    """
+    count = ending_index - starting_index + 1
+    block_start = starting_index + (count * (shard - 1)) // shard_count
+    block_end = starting_index + (count * shard) // shard_count - 1
+    return block_start, block_end
+
+
+# Stream bulk zips over HTTP with the driver's cookies instead of through chrome's downloads
+use_http_transport = False
+
+# Site searched, replaced by CreateDriver(base_url) to point at a stand-in such as mockmergent.py
+mergent_url = "https://www-mergentarchives-com.proxy1.cl.msu.edu"
+
+# Return from navigations once the DOM is ready and skip resources the scripts never read
+fast_profile = True
+
+# Keep each browser's profile in chrome_profiles so the proxy login and http cache survive restarts
+persistent_profile = True
+
+# Url patterns blocked through DevTools when fast_profile is on, none are needed to search or download
+BLOCKED_URLS = [
+    "*.png",
+    "*.jpg",
+    "*.jpeg",
+    "*.gif",
+    "*.svg",
+    "*.ico",
+    "*.woff",
+    "*.woff2",
+    "*.ttf",
+    "*.otf",
+    "*.eot",
+    "*google-analytics.com*",
+    "*googletagmanager.com*",
+    "*doubleclick.net*",
+    "*analytics.js*",
+]
+
+
+def SearchUrl():
+    """
+    Return: string url of the search page
+    """
+    return mergent_url + "/search.php"
+
+
 def GetDownloadDirectory():
     """
     Used in setting default web browser and renaming downloaded files
@@ -63,11 +160,36 @@ def GetDownloadDirectory():
     return download_dir
 
 
-def CreateDriver():
+def GetStagingDirectory():
+    """
+    Folder holding one staging subfolder per in progress download, kept out of zips
+    so unfinished files are never picked up as zips
+
+    Return: string path
+    """
+    return os.path.join(os.getcwd(), "staging")
+
+
+def GetProfileDirectory(profile):
+    """
+    profile -- name of the browser profile, one per concurrently open browser
+    Return: string path of the chrome user data folder for profile
+    """
+    return os.path.join(os.getcwd(), "chrome_profiles", profile)
+
+
+def CreateDriver(base_url=None, profile="browser1"):
     """
     Creates a Webdriver that dowloads to AnnualReports subfolder
+
+    base_url -- optional site to search instead of mergent archives, e.g. http://127.0.0.1:8000
+    profile -- chrome profile to reuse when persistent_profile is on, browsers open at once need their own
     Return: Webdriver with mergent archives loaded
     """
+    global mergent_url
+    if base_url:
+        mergent_url = base_url.rstrip("/")
+
     # Define the subfolder for downloads relative to the script location
     download_dir = GetDownloadDirectory()
     os.makedirs(
@@ -86,20 +208,32 @@ def CreateDriver():
     chrome_options.add_argument("--ignore-ssl-errors")
     chrome_options.add_argument("--disable-quic")
 
-    chrome_options.add_experimental_option(
-        "prefs",
-        {
-            "download.default_directory": download_dir,
-            "download.prompt_for_download": False,
-            "download.directory_upgrade": True,
-            "safebrowsing.enabled": True,
-        },
-    )
+    if persistent_profile:
+        chrome_options.add_argument("--user-data-dir=" + GetProfileDirectory(profile))
+
+    prefs = {
+        "download.default_directory": download_dir,
+        "download.prompt_for_download": False,
+        "download.directory_upgrade": True,
+        "safebrowsing.enabled": True,
+    }
+    if fast_profile:
+        chrome_options.page_load_strategy = "eager"  # every element is waited on anyway
+        prefs["profile.managed_default_content_settings.images"] = 2
+    chrome_options.add_experimental_option("prefs", prefs)
+    if use_http_transport:
+        # httptransport reads the bulk download request back from this log
+        chrome_options.set_capability("goog:loggingPrefs", {"performance": "ALL"})
+
     # apply options
     driver = webdriver.Chrome(options=chrome_options)
 
+    if fast_profile:
+        driver.execute_cdp_cmd("Network.enable", {})
+        driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": BLOCKED_URLS})
+
     # Initial Access mergent archives
-    driver.get("https://www-mergentarchives-com.proxy1.cl.msu.edu/search.php")
+    driver.get(SearchUrl())
     return driver
 
 
@@ -139,20 +273,31 @@ def SearchActions(driver, bar, key, val, total_download, search_all, specific_ye
 
     driver -- webdriver element on the search page
     val -- string value, the company name
-    total_download -- kb downloaded in current cycle
+    total_download -- kb downloaded so far
 
     Return: void
     """
+    plan = PlanFromCache(key, val, search_all, specific_years)
+    if plan is not None and not plan["download"]:
+        # Every page is known and none needs downloading, no search needed
+        return ApplyCachedSearch(
+            driver, bar, key, val, total_download, search_all, specific_years, plan
+        )
+
+    with phasetrace.Phase("throttle"):
+        scheduler.Wait(bar)  # Nothing starts while the last hour is at the cap
+
     # Wait until doctype box appears, signalling page load
     load_success = 0
     wait = WebDriverWait(driver, 15)
     try:
-        documentQuery = wait.until(
-            EC.presence_of_element_located((By.ID, "ext-comp-1014"))
-        )
+        with phasetrace.Phase("navigation"):
+            documentQuery = wait.until(
+                EC.presence_of_element_located((By.ID, "ext-comp-1014"))
+            )
         load_success = 1
     except:
-        WriteZipTracker(key, val, "SK")
+        SkipFirm(key, val, "search page timeout", 0, search_all, specific_years)
         driver.refresh()
         time.sleep(2)
     if load_success:
@@ -175,34 +320,39 @@ def SearchActions(driver, bar, key, val, total_download, search_all, specific_ye
 
             attempt_count = 0  # counter for doctype attempts, if it takes more than 5, download will proceed with selected doctype
 
-            while doctype.get_attribute("value") != "ANR":
-                if attempt_count > 10:
-                    break
-                # Scroll to top
-                for x in range(0, 20):
-                    documentQuery.send_keys(Keys.ARROW_UP)
-                # Select ANR
-                for x in range(0, 3):
-                    documentQuery.send_keys(Keys.ARROW_DOWN)
-                documentQuery.send_keys(Keys.ENTER)
+            with phasetrace.Phase("doctype"):
+                while doctype.get_attribute("value") != "ANR":
+                    if attempt_count > 10:
+                        break
+                    # Scroll to top
+                    for x in range(0, 20):
+                        documentQuery.send_keys(Keys.ARROW_UP)
+                    # Select ANR
+                    for x in range(0, 3):
+                        documentQuery.send_keys(Keys.ARROW_DOWN)
+                    documentQuery.send_keys(Keys.ENTER)
 
-                attempt_count += 1
+                    attempt_count += 1
+            phasetrace.Count("doctype_attempts", attempt_count)
 
         submitButton = driver.find_element(By.ID, "ext-gen224")
         submitButton.click()
 
         total_download = ResultActions(
-            driver, bar, key, val, total_download, search_all, specific_years
+            driver, bar, key, val, total_download, search_all, specific_years, plan
         )
 
     return total_download
 
 
-def ResultActions(driver, bar, key, val, total_download, search_all, specific_years=[]):
+def ResultActions(
+    driver, bar, key, val, total_download, search_all, specific_years=[], plan=None
+):
     """
     All of the actions completed on the Search Results page
 
     driver -- webdriver landed on search results page
+    plan -- PlanFromCache result, pages outside plan["download"] are not visited
     Return: total download in kb
     """
 
@@ -215,6 +365,7 @@ def ResultActions(driver, bar, key, val, total_download, search_all, specific_ye
     wait = WebDriverWait(driver, 20)
     # Checks for occasional hang after search
     load_success = 0
+    results_start = time.monotonic()
 
     try:
         pageCountContainer = wait.until(
@@ -249,13 +400,24 @@ def ResultActions(driver, bar, key, val, total_download, search_all, specific_ye
         except TimeoutException:
             load_sucess = 0
 
+    phasetrace.AddPhase("navigation", time.monotonic() - results_start)
+
     if load_success == 1:
         try:
             last_page_number = ((pageCountContainer.text).split())[-1]
         except IndexError:
             last_page_number = "1"
+
+        # The site changed since the search was cached, its rows may have moved, so scrape live
+        if plan is not None and (
+            int(last_page_number) != plan["page_count"]
+            or reportCountContainer.text != plan["report_count"]
+        ):
+            plan = None
+
         # If there is only one page
         if last_page_number == "1":
+            phasetrace.StartPage(key, 1)
             scraperesults = ScrapeRows(
                 driver, key, date_values, last_page_number, search_all, specific_years
             )
@@ -263,13 +425,14 @@ def ResultActions(driver, bar, key, val, total_download, search_all, specific_ye
             date_values = scraperesults[0]
             page_size = scraperesults[1]
             filename = GenFileName(date_values, key, val, last_page_number, search_all)
+            CacheSearchPage(
+                val, search_all, 1, 1, reportCountContainer.text, scraperesults[2]
+            )
 
-            if total_download != 0.0:
-                total_download = CheckAndWait(
-                    bar, total_download + page_size
-                )  # check in between each file
+            if NextPage(key, search_all, specific_years) > 1:
+                pass  # finished before a restart
 
-            if (page_size + total_download) <= 1800000:
+            elif not TooLarge(page_size):
 
                 if reportCountContainer.text == "0":
 
@@ -279,17 +442,25 @@ def ResultActions(driver, bar, key, val, total_download, search_all, specific_ye
                         WriteZipTracker(key, val, "NA")
                     else:
                         # After either case, we go back to resume search
-                        driver.get(
-                            "https://www-mergentarchives-com.proxy1.cl.msu.edu/search.php"
-                        )
+                        phasetrace.EndPage()
+                        with phasetrace.Phase("navigation"):
+                            driver.get(SearchUrl())
                         total_download = SearchActions(
                             driver, bar, key, val, total_download, True
                         )  # Search again, no filter this time
 
                 else:
 
-                    zipsize = BulkDownload(driver, filename, search_all)
+                    zipsize = ScheduledDownload(
+                        driver,
+                        bar,
+                        filename,
+                        search_all,
+                        page_size,
+                        (key, val, search_all, specific_years),
+                    )
                     WriteZipTracker(key, val, last_page_number)
+                    CompletePage(key, search_all, 1, specific_years)
                     total_download += zipsize
                     if filename:
                         bar.text(
@@ -299,14 +470,61 @@ def ResultActions(driver, bar, key, val, total_download, search_all, specific_ye
 
             else:
                 WriteZipTracker(key, val, "TL")  # TL for too large
+                CompletePage(key, search_all, 1, specific_years)
 
         # multiple pages
         else:
+            # Every page's rows in one request, so only pages needing a download are visited
+            if plan is None:
+                with phasetrace.Phase("grid_load"):
+                    fetched = FetchAllPages(driver, int(last_page_number))
+                if fetched is not None:
+                    for page, rows in fetched.items():
+                        CacheSearchPage(
+                            val,
+                            search_all,
+                            page,
+                            last_page_number,
+                            reportCountContainer.text,
+                            rows,
+                        )
+                    plan = PlanFromCache(key, val, search_all, specific_years)
+
+            # Skip straight to the first page not finished before a restart
+            current_page = NextPage(key, search_all, specific_years)
+            shown_page = 1  # page the grid is showing
+
             while current_page <= int(
                 last_page_number
             ):  # until we are on the last page
 
                 zipsize = 0
+                phasetrace.StartPage(key, current_page)
+
+                # Pages the cache shows need no download are tracked without visiting them
+                if plan is not None and current_page not in plan["download"]:
+                    ApplyCachedPage(
+                        key, val, search_all, specific_years, plan, current_page
+                    )
+                    current_page += 1
+                    continue
+
+                # Go to page
+                if shown_page != current_page:
+                    with phasetrace.Phase("navigation"):
+                        page_shown = GoToPage(driver, current_page)
+                    if not page_shown:
+                        driver.refresh()
+                        SkipFirm(
+                            key,
+                            val,
+                            "page box timeout",
+                            current_page,
+                            search_all,
+                            specific_years,
+                        )
+                        break
+                    shown_page = current_page
 
                 try:
                     scraperesults = ScrapeRows(
@@ -318,8 +536,10 @@ def ResultActions(driver, bar, key, val, total_download, search_all, specific_ye
                         specific_years,
                     )
                 except StaleElementReferenceException:
+                    SkipFirm(
+                        key, val, "stale grid", current_page, search_all, specific_years
+                    )
                     current_page += 1
-                    WriteZipTracker(key, val, "SK")
                     driver.refresh()
                     time.sleep(2)
                     break
@@ -329,15 +549,23 @@ def ResultActions(driver, bar, key, val, total_download, search_all, specific_ye
                 filename = GenFileName(
                     date_values, key, val, str(current_page), search_all
                 )
-                if total_download != 0.0:
-                    total_download = CheckAndWait(
-                        bar, total_download + page_size
-                    )  # check in between each file
-
-                if (
-                    page_size + total_download
-                ) <= 1800000:  # if file greater than 180000 kb, mark and ship
-                    zipsize += BulkDownload(driver, filename, search_all)
+                CacheSearchPage(
+                    val,
+                    search_all,
+                    current_page,
+                    last_page_number,
+                    reportCountContainer.text,
+                    scraperesults[2],
+                )
+                if not TooLarge(page_size):  # if file greater than the cap, mark and ship
+                    zipsize += ScheduledDownload(
+                        driver,
+                        bar,
+                        filename,
+                        search_all,
+                        page_size,
+                        (key, val, search_all, specific_years),
+                    )
                     total_download += zipsize
                     date_values.clear()  # need seperate ranges for each page's zip
 
@@ -350,41 +578,133 @@ def ResultActions(driver, bar, key, val, total_download, search_all, specific_ye
 
                 else:
                     WriteZipTracker(key, val, "TL")  # TL for too large
-
-                total_download = CheckAndWait(
-                    bar, total_download
-                )  # check in between each file
-
-                if current_page != int(last_page_number):
-                    # Go to next page
-                    current_page += 1
-                    wait = WebDriverWait(driver, 60)
-
-                    try:
-                        pageQuery = wait.until(
-                            EC.presence_of_element_located((By.ID, "ext-gen147"))
-                        )
-                    except TimeoutException:
-                        driver.refresh()
-                        WriteZipTracker(key, val, "SK")
-                        break
-
-                    pageQuery.send_keys(Keys.CONTROL + "a")
-                    pageQuery.send_keys(Keys.BACK_SPACE)
-                    pageQuery.send_keys(current_page)
-                    pageQuery.send_keys(Keys.ENTER)  # redirects to next page
-                else:
-                    break
+                CompletePage(key, search_all, current_page, specific_years)
+                current_page += 1
     else:
         driver.refresh()
-        WriteZipTracker(key, val, "SK")
+        SkipFirm(key, val, "results timeout", 0, search_all, specific_years)
 
     # After either case, we go back to resume search
-    driver.get("https://www-mergentarchives-com.proxy1.cl.msu.edu/search.php")
+    phasetrace.EndPage()
+    with phasetrace.Phase("navigation"):
+        driver.get(SearchUrl())
 
     return total_download
 
 
+# Returns the number of results grid rows, or -1 while an ExtJS loading mask is still visible
+GRID_STATE_SCRIPT = """
+var masks = document.querySelectorAll(".ext-el-mask, .ext-el-mask-msg, .x-mask-loading");
+for (var i = 0; i < masks.length; i++) {
+    var style = window.getComputedStyle(masks[i]);
+    if (style.display != "none" && style.visibility != "hidden") {
+        return -1;
+    }
+}
+return document.evaluate("//*[@id='ext-gen96']/table/tbody/tr", document, null,
+    XPathResult.ORDERED_NODE_SNAPSHOT_TYPE, null).snapshotLength;
+"""
+
+def GoToPage(driver, page):
+    """
+    Moves the results grid to another page through the page number box
+
+    driver -- webdriver on a company's results page
+    page -- int page to show
+    Return: bool, false if the page number box never appeared
+    """
+    wait = WebDriverWait(driver, 60)
+
+    try:
+        pageQuery = wait.until(EC.presence_of_element_located((By.ID, "ext-gen147")))
+    except TimeoutException:
+        return False
+
+    # The grid rerenders its rows for the next page, the old first row going stale marks the switch
+    old_rows = driver.find_elements(By.XPATH, "//*[@id='ext-gen96']/table/tbody/tr")
+
+    pageQuery.send_keys(Keys.CONTROL + "a")
+    pageQuery.send_keys(Keys.BACK_SPACE)
+    pageQuery.send_keys(page)
+    pageQuery.send_keys(Keys.ENTER)  # redirects to page
+
+    if old_rows:
+        try:
+            WebDriverWait(driver, 20, poll_frequency=0.25).until(
+                EC.staleness_of(old_rows[0])
+            )
+        except TimeoutException:
+            pass  # LoadTable still waits for the grid to settle
+    return True
+
+
+wait_log = {}  # function name: list of seconds actually spent waiting per call
+
+
+def RecordWait(name, seconds):
+    """
+    Stores time waited by one call of name
+
+    Return: void
+    """
+    wait_log.setdefault(name, []).append(seconds)
+
+
+def WaitSummary():
+    """
+    Return: string with call count, average and total wait for each recorded function
+    """
+    summary = []
+    for name, waits in wait_log.items():
+        summary.append(
+            name
+            + ": "
+            + str(len(waits))
+            + " calls, "
+            + str(round(sum(waits) / len(waits), 2))
+            + "s average, "
+            + str(round(sum(waits) / 60.0, 1))
+            + " minutes total"
+        )
+    return "\n".join(summary)
+
+
+class GridSettled:
+    """
+    Expected condition for WebDriverWait, true once the results grid has no loading mask
+    and its row count is the same on two polls in a row
+    """
+
+    def __init__(self):
+        self.last_count = None
+
+    def __call__(self, driver):
+        count = driver.execute_script(GRID_STATE_SCRIPT)
+        if count < 0:  # still loading
+            self.last_count = None
+            return False
+
+        settled = count == self.last_count
+        self.last_count = count
+        return settled
+
+
+def RetryStale(action, attempts=3):
+    """
+    Calls action again if the page rerendered the elements it was using
+
+    action -- function without arguments
+    attempts -- calls before the StaleElementReferenceException is raised
+    Return: return of action
+    """
+    for attempt in range(attempts):
+        try:
+            return action()
+        except StaleElementReferenceException:
+            if attempt == attempts - 1:
+                raise
+
+
 def LoadTable(driver):
     """
     Completely loads table and all of its rows for the search results page
@@ -392,99 +712,426 @@ def LoadTable(driver):
     driver -- webdriver on the search page
     Return: rows: list of row elements
     """
-
-    time.sleep(5)  # TEMP PREVENTS STALE ERROR
-
-    # Wait until table of results completely loads
-    wait = WebDriverWait(driver, 20)
+    start = time.monotonic()
+
+    # Wait until table of results completely loads, polling instead of a fixed sleep
+    wait = WebDriverWait(
+        driver,
+        20,
+        poll_frequency=0.25,
+        ignored_exceptions=[StaleElementReferenceException],
+    )
     wait.until(
         EC.presence_of_element_located((By.XPATH, "//*[@id='ext-gen96']/table/tbody"))
     )
+    wait.until(GridSettled())
     rows = wait.until(
         EC.presence_of_all_elements_located(
             (By.XPATH, "//*[@id='ext-gen96']/table/tbody/tr")
         )
     )
 
+    RecordWait("LoadTable", time.monotonic() - start)
     return rows
 
 
+# Reads every data row of the results grid in one round trip. Mirrors the cells ScrapeRows used to
+# read one element at a time: cells[1] name, cells[3] date, cells[4] doctype, cells[5] size,
+# cells[0] checkbox. Text is trimmed like WebElement.text.
+READ_GRID_SCRIPT = """
+var rows = document.evaluate("//*[@id='ext-gen96']/table/tbody/tr", document, null,
+    XPathResult.ORDERED_NODE_SNAPSHOT_TYPE, null);
+var text = function (cell) {
+    var div = cell.getElementsByTagName("div")[0];
+    return div ? div.innerText.trim() : "";
+};
+var grid = [];
+for (var i = 0; i < rows.snapshotLength; i++) {
+    var cells = rows.snapshotItem(i).getElementsByTagName("td");
+    if (cells.length > 5) {
+        grid.push({
+            index: i,
+            name: text(cells[1]),
+            date: text(cells[3]),
+            doctype: text(cells[4]),
+            size: text(cells[5]),
+            checkbox: cells[0].getElementsByTagName("input")[0] || null
+        });
+    }
+}
+return grid;
+"""
+
+
+def ReadGrid(driver):
+    """
+    Pulls every row of the loaded results grid with a single execute_script call
+
+    driver -- webdriver on a company's results page, table already loaded
+    Return: list of dicts with keys index (row in table), name, date, doctype, size (strings)
+            and checkbox (WebElement or None)
+    """
+    return driver.execute_script(READ_GRID_SCRIPT)
+
+
+bulk_grid_fetch = True  # read every results page from the grid's data store at once, False pages through the grid
+bulk_fetch_timeout = 30  # seconds FetchAllPages waits for the store request
+
+# Requests every row of the search from the ExtJS store behind the results grid, leaving the grid on its
+# page. Cells are rendered by the grid's own column renderers, so name (column 1), date (3), doctype (4)
+# and size (5) read the same as READ_GRID_SCRIPT. Calls back with null if there is no such grid.
+FETCH_STORE_SCRIPT = """
+var timeout = arguments[0] * 1000;
+var done = arguments[arguments.length - 1];
+try {
+    var table = document.getElementById("ext-gen96");
+    var grid = null;
+    Ext.ComponentMgr.all.each(function (component) {
+        if (component.isXType && component.isXType("grid") && component.rendered
+                && component.getEl().dom.contains(table)) {
+            grid = component;
+            return false;
+        }
+    });
+    if (!grid) { done(null); return; }
+
+    var store = grid.getStore();
+    var columns = grid.getColumnModel();
+    var paging = grid.getBottomToolbar ? grid.getBottomToolbar() : null;
+    var lastParams = store.lastOptions && store.lastOptions.params ? store.lastOptions.params : {};
+    var pageSize = (paging && paging.pageSize) || lastParams.limit || 0;
+    var params = Ext.apply(Ext.apply({}, store.baseParams), lastParams);
+    params.start = 0;
+    params.limit = store.getTotalCount();
+
+    var text = function (record, row, column) {
+        var value = record.get(columns.getDataIndex(column));
+        var renderer = columns.getRenderer(column);
+        var cell = document.createElement("div");
+        cell.innerHTML = String((renderer ? renderer(value, {}, record, row, column, store) : value) || "");
+        return (cell.textContent || "").trim();
+    };
+
+    Ext.Ajax.request({
+        url: store.proxy.url || store.proxy.conn.url,
+        method: store.proxy.conn && store.proxy.conn.method ? store.proxy.conn.method : "POST",
+        params: params,
+        timeout: timeout,
+        success: function (response) {
+            try {
+                var records = store.reader.read(response).records;
+                var rows = [];
+                for (var i = 0; i < records.length; i++) {
+                    rows.push({
+                        index: i,
+                        name: text(records[i], i, 1),
+                        date: text(records[i], i, 3),
+                        doctype: text(records[i], i, 4),
+                        size: text(records[i], i, 5)
+                    });
+                }
+                done({pageSize: pageSize, rows: rows});
+            } catch (error) {
+                done(null);
+            }
+        },
+        failure: function () { done(null); }
+    });
+} catch (error) {
+    done(null);
+}
+"""
+
+
+def FetchAllPages(driver, page_count):
+    """
+    Reads the rows of every results page with one request to the grid's data store, without paging the grid
+
+    driver -- webdriver on a company's results page
+    page_count -- int pages shown by the pager
+    Return: dict of page number: rows like ReadGrid's (without checkbox), None if the store could not be read
+    """
+    if not bulk_grid_fetch:
+        return None
+
+    start = time.monotonic()
+    try:
+        driver.set_script_timeout(bulk_fetch_timeout + 5)
+        fetched = driver.execute_async_script(FETCH_STORE_SCRIPT, bulk_fetch_timeout)
+    except WebDriverException:
+        fetched = None
+    RecordWait("FetchAllPages", time.monotonic() - start)
+
+    if not fetched or not fetched["pageSize"]:
+        return None
+    rows = fetched["rows"]
+    page_size = int(fetched["pageSize"])
+    if -(-len(rows) // page_size) != page_count:
+        return None  # store and pager disagree, page through the grid instead
+    return {
+        page: rows[(page - 1) * page_size : page * page_size]
+        for page in range(1, page_count + 1)
+    }
+
+
+def ClickCheckbox(driver, row):
+    """
+    Clicks the checkbox of a ReadGrid row, rereading the grid once if the row was rerendered
+
+    driver -- webdriver on a company's results page
+    row -- dict from ReadGrid
+    Return: void
+    """
+    try:
+        row["checkbox"].click()
+    except StaleElementReferenceException:
+        for fresh_row in ReadGrid(driver):
+            if fresh_row["index"] == row["index"]:
+                fresh_row["checkbox"].click()
+                break
+
+
 def ScrapeRows(driver, key, date_values, page_number, search_all, specific_years=[]):
     """
-    Grabs date values from table of results
+    Grabs date values from table of results, clicking a checkbox is the only per row browser call
 
     driver -- webdriver on a company's results page
-    Return: return_description
+    Return: tuple (list of years, page size in kb, rows read from the grid)
     """
-    rows = LoadTable(driver)
+
+    def ReadLoadedGrid():
+        LoadTable(driver)
+        return ReadGrid(driver)
+
+    with phasetrace.Phase("grid_load"):
+        rows = RetryStale(ReadLoadedGrid)
+    scrape_start = time.monotonic()
     invalids = ["", " "]
     valid_docs = ["Annual/10K Report", "10K or Int'l Equivalent"]
     page_size_kb = 0
     # check each row for values
     count = 1
+    for row in rows:  # rows with empty cols used for spacing are already filtered out
+
+        if not search_all or row["doctype"] in valid_docs:
+
+            year = (row["date"])[-4:]  # dates hold year information
+
+            # If were looking through multiple doctypes we need to select individual files
+            if search_all:
+                try:
+                    if len(specific_years) > 0:  # If looking for specific years
+                        if year not in specific_years:
+                            continue  # Will not toggle checkbox
+                    ClickCheckbox(driver, row)
+                except (
+                    ElementClickInterceptedException
+                ):  # Will only occur at small resolutions, not in headlessly
+                    continue  # Will not toggle checkbox
+
+            page_size_kb += SizeKb(row["size"])
+
+            # year will be last four digits
+
+            if year not in invalids:  # Some empty values after last year
+                date_values.append(year)  # last 4 chars will always be the year
+
+                # If a valid year is found, the file is going to be downloaded, so we need to track
+                WriteFilesTracker(
+                    key,
+                    row["name"],
+                    count,
+                    page_number,
+                    row["date"],
+                    row["doctype"],
+                )
+        count += 1
+
+    phasetrace.AddPhase("scrape", time.monotonic() - scrape_start)
+    return date_values, page_size_kb, rows
+
+
+def SizeKb(size):
+    """
+    size -- size cell of the grid, e.g. "512 KB" or "1.2 MB"
+    Return: float kb, 0 if the cell is blank
+    """
+    invalids = ["", " "]
+    value = size[:-2]
+    units = size[-2:]
+
+    if units in invalids or value in invalids:
+        return 0.0
+    value = float(value)
+    if units == "MB":
+        value *= 1000
+    elif units == "GB":
+        value *= 1000000
+    return value
+
+
+search_cache_ttl = 30 * 24 * 3600  # seconds a cached search result is trusted
+
+
+def CacheSearchPage(val, search_all, page, page_count, report_count, rows):
+    """
+    Stores one scraped page of search results, replacing what was cached for it
+
+    val -- company name searched
+    search_all -- bool, false for annual report searches
+    page -- int page number
+    page_count -- pages the search returned
+    report_count -- reports the search returned
+    rows -- ReadGrid rows of the page
+    Return: void
+    """
+    kind = "ALL" if search_all else "ANR"
+    cached_rows = [
+        {field: row[field] for field in ["name", "date", "doctype", "size"]}
+        for row in rows
+    ]
+    with runstate.lock:
+        runstate.Delete("searchcache", term=val, kind=kind, page=page)
+        runstate.Insert(
+            "searchcache",
+            [
+                val,
+                kind,
+                page,
+                page_count,
+                report_count,
+                json.dumps(cached_rows),
+                int(time.time()),
+            ],
+        )
+        runstate.Commit()
+
+
+def CachedSearch(val, search_all):
+    """
+    Returns the cached results of a search if every page is cached and within search_cache_ttl
+
+    val -- company name searched
+    search_all -- bool, false for annual report searches
+    Return: dict with page_count, report_count and pages (page number: rows), None if not cached
+    """
+    kind = "ALL" if search_all else "ANR"
+    oldest = time.time() - search_cache_ttl
+    pages = {}
+    page_count = report_count = None
+
+    for term, kind, page, page_count, report_count, rows, scraped_at in runstate.Select(
+        "searchcache", term=val, kind=kind
+    ):
+        if float(scraped_at) < oldest:
+            return None
+        pages[int(page)] = json.loads(rows)
+
+    if page_count is None or set(pages) != set(range(1, int(page_count) + 1)):
+        return None
+    return {
+        "page_count": int(page_count),
+        "report_count": report_count,
+        "pages": pages,
+    }
+
+
+def PlanPage(key, val, rows, page, search_all, specific_years=[]):
+    """
+    Works out from cached rows what ScrapeRows would select on a page, without a browser
+
+    rows -- cached rows of the page
+    page -- int page number
+    Return: tuple (list of years, page size in kb, filestracker rows, zip name or "" if on disk)
+    """
+    valid_docs = ["Annual/10K Report", "10K or Int'l Equivalent"]
+    date_values = []
+    files = []
+    page_size_kb = 0
+    count = 1
     for row in rows:
-        cells = row.find_elements(By.TAG_NAME, "td")
-        if (
-            len(cells) > 5
-        ):  # rows with empty cols used for spacing, anything greater than 3 holds real data
-
-            year_div = cells[3].find_element(
-                By.TAG_NAME, "div"
-            )  # dates are nested within a div, cells[3] holds year information
-            doc_div = cells[4].find_element(
-                By.TAG_NAME, "div"
-            )  # cells[4] holds doc_type information
-            name_div = cells[1].find_element(
-                By.TAG_NAME, "div"
-            )  # cells[1] holds name information
-            size_div = cells[5].find_element(
-                By.TAG_NAME, "div"
-            )  # dates are nested within a div, cells[5] has full date
-
-            if not search_all or doc_div.text in valid_docs:
-
-                year = (year_div.text)[-4:]
-
-                # If were looking through multiple doctypes we need to select individual files
-                if search_all:
-                    try:
-                        if len(specific_years) > 0:  # If looking for specific years
-                            if year not in specific_years:
-                                continue  # Will not toggle checkbox
-                        (cells[0].find_element(By.TAG_NAME, "input")).click()
-                    except (
-                        ElementClickInterceptedException
-                    ):  # Will only occur at small resolutions, not in headlessly
-                        continue  # Will not toggle checkbox
-
-                value = (size_div.text)[:-2]
-                units = size_div.text[-2:]
-
-                if units not in invalids and value not in invalids:
-                    value = float(value)
-                    if units == "MB":
-                        value *= 1000
-                    elif units == "GB":
-                        value *= 1000000
-                    page_size_kb += value
-
-                # year will be last four digits
-
-                if year not in invalids:  # Some empty values after last year
-                    date_values.append(year)  # last 4 chars will always be the year
-
-                    # If a valid year is found, the file is going to be downloaded, so we need to track
-                    WriteFilesTracker(
-                        key,
-                        name_div.text,
-                        count,
-                        page_number,
-                        year_div.text,
-                        doc_div.text,
-                    )
-            count += 1
+        if not search_all or row["doctype"] in valid_docs:
+            year = row["date"][-4:]
+            if search_all and len(specific_years) > 0 and year not in specific_years:
+                continue  # same row numbering as ScrapeRows
+
+            page_size_kb += SizeKb(row["size"])
+            if year not in ["", " "]:
+                date_values.append(year)
+                files.append(
+                    [key, row["name"], count, page, row["date"], row["doctype"]]
+                )
+        count += 1
+
+    filename = GenFileName(date_values, key, val, str(page), search_all)
+    return date_values, page_size_kb, files, filename
+
+
+def PlanFromCache(key, val, search_all, specific_years=[]):
+    """
+    Decides from cached search results which pages still need the browser
+
+    Return: dict of CachedSearch plus "download", the set of pages to visit, and "sizes",
+    kb of each page to visit, None if not cached
+    """
+    cached = CachedSearch(val, search_all)
+    if cached is None:
+        return None
+
+    cached["download"] = set()
+    cached["sizes"] = {}
+    for page, rows in cached["pages"].items():
+        date_values, page_size, files, filename = PlanPage(
+            key, val, rows, page, search_all, specific_years
+        )
+        if filename and not TooLarge(page_size):
+            cached["download"].add(page)
+            cached["sizes"][page] = page_size
+    return cached
+
+
+def ApplyCachedPage(key, val, search_all, specific_years, plan, page):
+    """
+    Writes the tracker rows a visit to a page would, for a page that needs no download
+
+    plan -- PlanFromCache result
+    page -- int page number
+    Return: void
+    """
+    date_values, page_size, files, filename = PlanPage(
+        key, val, plan["pages"][page], page, search_all, specific_years
+    )
+    for row in files:
+        WriteFilesTracker(*row)
+
+    if not TooLarge(page_size):
+        WriteZipTracker(key, val, str(page))
+    else:
+        WriteZipTracker(key, val, "TL")  # TL for too large
+    CompletePage(key, search_all, page, specific_years)
+
+
+def ApplyCachedSearch(
+    driver, bar, key, val, total_download, search_all, specific_years, plan
+):
+    """
+    Records a search entirely from the cache, for searches with nothing to download
 
-    return date_values, page_size_kb
+    plan -- PlanFromCache result with no pages to download
+    Return: total download in kb
+    """
+    if plan["report_count"] == "0":
+        if search_all:
+            WriteZipTracker(key, val, "NA")
+        else:
+            total_download = SearchActions(
+                driver, bar, key, val, total_download, True
+            )  # Search again, no filter this time
+        return total_download
+
+    for page in range(NextPage(key, search_all, specific_years), plan["page_count"] + 1):
+        ApplyCachedPage(key, val, search_all, specific_years, plan, page)
+    return total_download
 
 
 def GenFileName(date_values, key, val, page, search_all):
@@ -506,7 +1153,7 @@ def GenFileName(date_values, key, val, page, search_all):
         if search_all:
             filename += "_altreport"
 
-        if ZipExistCheck("\\" + filename.replace(" ", "-")):
+        if ZipExistCheck(filename.replace(" ", "-")):
             filename = ""  # if it exists, we pass a blank filename so it wont trigger a download
 
     return filename
@@ -514,111 +1161,297 @@ def GenFileName(date_values, key, val, page, search_all):
 
 def ZipExistCheck(filename):
     """
-    Checks if a zip file exists in ARC_Zips
+    Checks if a zip file exists in ARC_Zips, using the inventory instead of the disk
 
     Keyword arguments:
-    filename-- string which stores formatted file name
+    filename-- string which stores formatted file name, spaces already replaced
     Return: bool
     """
-    return os.path.isfile(GetDownloadDirectory() + filename + ".zip")
+    parsed = ParseZipName(filename)
+    if parsed is None:
+        return False
+    with inventory_lock:
+        entry = inventory.get(parsed[0])
+    return entry is not None and entry[2] == filename
+
+
+inventory = {}  # (gvkey, page, altreport): (start year, end year, zip name without .zip)
+inventory_lock = threading.Lock()
 
 
-def BulkDownload(driver, filename, search_all):
+def ParseZipName(filename):
     """
-    Starts a bulk download, halts selenium until download is complete and renamed
+    Splits a zip name made by GenFileName, key_name_startyear_endyear_page[_altreport]
 
-    driver -- webdriver on a search results page
-    filename -- valid formatted string
-    Return: size of zip file downloaded
+    filename -- zip name with or without .zip
+    Return: ((gvkey, page, altreport), (start year, end year, name without .zip)), None if not a zip name
     """
+    if filename.endswith(".zip"):
+        filename = filename[:-4]
 
-    file_size = 0
+    parts = filename.split("_")
+    altreport = parts[-1] == "altreport"
+    if altreport:
+        parts = parts[:-1]
 
-    if filename:
+    if len(parts) < 5 or not all(part.isnumeric() for part in parts[-3:]):
+        return None
 
-        # wait for buttons to load
-        wait = WebDriverWait(driver, 20)
-        bulkDownloadButton = wait.until(
-            EC.presence_of_element_located((By.ID, "bulk_download_btn"))
-        )
-        wait = WebDriverWait(driver, 30)
+    return (parts[0], parts[-1], altreport), (parts[-3], parts[-2], filename)
 
-        time.sleep(4)  # TEMP in case above 2 lines do not work
-        checkAllButton = wait.until(
-            EC.presence_of_element_located((By.ID, "check_all_label"))
-        )
-        try:
-            # Files will be selected individually for alt reports
-            if not search_all:
-                checkAllButton.click()  # selects all files
 
-            bulkDownloadButton.click()  # begin bulk download
-            file_size = CompleteDownloadAndRename(filename)
-        except ElementClickInterceptedException:
-            file_size = 0
+def LoadInventory(directory=None):
+    """
+    Reads the zips folder once into the inventory, to be called before any search
 
-    return file_size
+    directory -- folder of zips, defaults to GetDownloadDirectory
+    Return: int, number of zips found
+    """
+    directory = directory or GetDownloadDirectory()
+    found = {}
 
+    if os.path.isdir(directory):
+        for entry in os.scandir(directory):
+            parsed = ParseZipName(entry.name) if entry.name.endswith(".zip") else None
+            if parsed is not None:
+                found[parsed[0]] = parsed[1]
 
-def CompleteDownloadAndRename(filename):
-    """
-    Waits for the download of the most recent file to complete, renames it with the string parameter.
-    To be called with each download.
+    with inventory_lock:
+        inventory.clear()
+        inventory.update(found)
+    return len(found)
 
-    filename -- string to rename file with
-    Return: size of the file downloaded
+
+def AddToInventory(filename):
     """
-    file_size_kb = 0
+    Records a zip just moved into the zips folder
 
-    if len(filename) > 0:  # check for empty string
+    filename -- zip name without .zip
+    Return: void
+    """
+    parsed = ParseZipName(filename)
+    if parsed is not None:
+        with inventory_lock:
+            inventory[parsed[0]] = parsed[1]
 
-        # replace spaces with hyphens to avoid spaces in a path
-        filename = filename.replace(" ", "-")
 
-        # Get ARC_Zips path
-        download_dir = GetDownloadDirectory()
-        search_pattern = os.path.join(download_dir, f"*.*")
+def FirmsOnDisk():
+    """
+    Finds firms that need no search: their last ziptracker row is not SK, no page of theirs is
+    checkpointed as in progress, and every page they were found on has its zip in the inventory,
+    or was marked TL while download_oversize is off
 
-        # Grab most recent
-        files = glob.glob(search_pattern)
+    Return: set of company keys
+    """
+    pages = {}  # gvkey: list of ziptracker pages in order
+    for key, name, page in runstate.Rows("ziptracker"):
+        pages.setdefault(key, []).append(page)
 
-        if not files:
-            return 0  # If no files, break
+    # TL pages were never downloaded, with download_oversize on their firms are searched again
+    skipped = ["NA", "SK"] if download_oversize else ["NA", "TL", "SK"]
 
-        while 1:
-            # Grab most recent
-            files = glob.glob(search_pattern)
-            try:
-                most_recent_file = max(files, key=os.path.getmtime)
-                if most_recent_file[-3:] == "tmp":
-                    time.sleep(2)
-                    most_recent_file = max(files, key=os.path.getmtime)
-                break
-            except FileNotFoundError:
+    with inventory_lock:
+        on_disk = set()
+        for key, key_pages in pages.items():
+            if key_pages[-1] == "SK":
                 continue
+            if NextPage(key, False) > 1 or NextPage(key, True) > 1:
+                continue  # stopped partway through a search
+            if all(
+                page in skipped
+                or (key, page, False) in inventory
+                or (key, page, True) in inventory
+                for page in key_pages
+            ):
+                on_disk.add(key)
 
-        try:
-            file_size_kb = os.path.getsize(most_recent_file) / 1024
-        except FileNotFoundError:
-            file_size_kb = 0.0
+    return on_disk
 
-        # Only rename if file is fully downloaded
-        if most_recent_file.endswith(".crdownload") or most_recent_file.endswith(
-            ".tmp"
-        ):  # these extensions mean the download is not complete
-            time.sleep(1)
-            file_size_kb = CompleteDownloadAndRename(filename)
 
-        else:
-            new_name = os.path.join(download_dir, filename)
-            os.rename(most_recent_file, new_name + ".zip")
+def YearsOnDisk(key, years):
+    """
+    Checks whether unfiltered (altreport) zips already cover every year a tertiary check wants
 
-    return file_size_kb
+    key -- company key
+    years -- list of year strings
+    Return: bool
+    """
+    with inventory_lock:
+        ranges = [
+            (int(start), int(end))
+            for (gvkey, page, altreport), (start, end, name) in inventory.items()
+            if gvkey == key and altreport
+        ]
+    return all(
+        any(start <= int(year) <= end for start, end in ranges) for year in years
+    )
 
 
-def UncompSize(folder):
+def BulkDownload(driver, filename, search_all, wait=True):
     """
-    Returns uncompressed size of all files in a zip
+    Starts a bulk download, halts selenium until download is complete and renamed
+
+    driver -- webdriver on a search results page
+    filename -- valid formatted string
+    wait -- false to return as soon as the download has started, see Return
+    Return: size of zip file downloaded, or if not wait a function without arguments that
+            completes the download and returns its size
+    """
+
+    def complete():
+        return 0
+
+    if filename:
+
+        start = time.monotonic()
+
+        # wait for buttons to load and become clickable, instead of a fixed sleep
+        waiter = WebDriverWait(driver, 20, poll_frequency=0.25)
+        bulkDownloadButton = waiter.until(
+            EC.element_to_be_clickable((By.ID, "bulk_download_btn"))
+        )
+        waiter = WebDriverWait(driver, 30, poll_frequency=0.25)
+        waiter.until(GridSettled())
+        checkAllButton = waiter.until(
+            EC.element_to_be_clickable((By.ID, "check_all_label"))
+        )
+        RecordWait("BulkDownload", time.monotonic() - start)
+        phasetrace.AddPhase("download_start", time.monotonic() - start)
+        try:
+            # Files will be selected individually for alt reports
+            if not search_all:
+                checkAllButton.click()  # selects all files
+
+            if use_http_transport:
+                # Request is replayed outside the browser, straight to the final zip path
+                complete = HttpDownload(
+                    driver, bulkDownloadButton.click, filename, wait=False
+                )
+            else:
+                # Download lands in its own staging folder, watched from before the click
+                watcher = downloadwatcher.Arm(driver, GetStagingDirectory())
+                try:
+                    bulkDownloadButton.click()  # begin bulk download
+                except:
+                    watcher.Close()
+                    raise
+
+                def complete():
+                    try:
+                        return CompleteDownloadAndRename(filename, watcher)
+                    finally:
+                        watcher.Close()
+
+        except ElementClickInterceptedException:
+            pass  # nothing downloaded
+
+    if wait:
+        return complete()
+    return complete
+
+
+transfer_log = []  # (zip name, bytes, seconds) for every completed download
+
+
+def CompleteDownloadAndRename(filename, watcher):
+    """
+    Waits for the download tied to watcher to complete, moves it into zips renamed with the string parameter.
+    To be called with each download.
+
+    filename -- string to rename file with
+    watcher -- DownloadWatcher armed before the download was started
+    Return: size of the file downloaded
+    """
+    file_size_kb = 0
+
+    if len(filename) > 0:  # check for empty string
+
+        # replace spaces with hyphens to avoid spaces in a path
+        filename = filename.replace(" ", "-")
+
+        # Returns as soon as chrome closes the finished file
+        with phasetrace.Phase("transfer"):
+            downloaded_file = watcher.Wait()
+
+        if downloaded_file is None:
+            return 0  # If no download started or it stalled, break
+
+        file_size_kb = watcher.bytes / 1024
+        phasetrace.Bytes(watcher.bytes)
+
+        new_name = os.path.join(GetDownloadDirectory(), filename)
+        with phasetrace.Phase("rename"):
+            os.replace(downloaded_file, new_name + ".zip")
+        AddToInventory(filename)
+        transfer_log.append((filename + ".zip", watcher.bytes, watcher.seconds))
+
+    return file_size_kb
+
+
+def HttpDownload(driver, click, filename, wait=True):
+    """
+    Downloads a bulk zip through httptransport instead of chrome's download manager
+
+    driver -- webdriver on a search results page
+    click -- function that starts the bulk download
+    filename -- string to name file with
+    wait -- false to return once the transfer has started, see BulkDownload
+    Return: size of the file downloaded, or if not wait a function returning it
+    """
+    filename = filename.replace(" ", "-")  # avoid spaces in a path
+    path = os.path.join(GetDownloadDirectory(), filename + ".zip")
+
+    # Partial file has a fixed name in staging so a rerun resumes it
+    os.makedirs(GetStagingDirectory(), exist_ok=True)
+    part_path = os.path.join(GetStagingDirectory(), filename + ".zip.part")
+
+    with phasetrace.Phase("download_start"):
+        transfer = httptransport.Download(driver, click, path, part_path)
+
+    def complete():
+        if transfer is None:
+            return 0  # If no download started or it stalled, break
+
+        try:
+            with phasetrace.Phase("transfer"):
+                size_bytes, seconds = transfer.result()  # includes the rename, done by Fetch
+        except requests.RequestException as error:
+            # The .part file is kept, so the page's next download resumes it
+            print("Download of " + filename + " failed: " + str(error))
+            return 0
+        phasetrace.Bytes(size_bytes)
+        AddToInventory(filename)
+        transfer_log.append((filename + ".zip", size_bytes, seconds))
+        return size_bytes / 1024
+
+    if wait:
+        return complete()
+    return complete
+
+
+def TransferSummary():
+    """
+    Summarizes every download completed this run
+
+    Return: string with zip count, size and average throughput
+    """
+    total_bytes = sum(transfer[1] for transfer in transfer_log)
+    total_seconds = sum(transfer[2] for transfer in transfer_log)
+    rate = total_bytes / total_seconds if total_seconds else 0.0
+
+    return (
+        str(len(transfer_log))
+        + " zips, "
+        + str(round(total_bytes / 1000000.0, 2))
+        + "MB at "
+        + str(round(rate / 1000000.0, 2))
+        + "MB/s"
+    )
+
+
+def UncompSize(folder):
+    """
+    Returns uncompressed size of all files in a zip
 
     Keyword arguments:
     folder -- zip folder
@@ -636,30 +1469,130 @@ def UncompSize(folder):
 
 def CreateTrackers():
     """
-    Creates tracking csv of all files.
+    Opens the run state store, importing existing tracker csvs on first use.
     To be called once before WriteTracker.
 
     Return: void
     """
-    if os.path.exists("./trackers/ziptracker.csv") == 0:
-        # Create and write headers for trackers
-        with open("./trackers/ziptracker.csv", "w", newline="") as file:
-            writer = csv.writer(file)
-            fields = ["Global Company Key", "Company Name", "Page Found On"]
-            writer.writerow(fields)
-
-    if os.path.exists("./trackers//filestracker.csv") == 0:
-        with open("./trackers/filestracker.csv", "w", newline="") as file:
-            writer = csv.writer(file)
-            fields = [
-                "Global Company Key",
-                "Company Name",
-                "Row Number",
-                "Page Number",
-                "Filing Date",
-                "Doctype",
-            ]
-            writer.writerow(fields)
+    os.makedirs("./trackers", exist_ok=True)
+    runstate.Connect()
+
+
+class Tracker:
+    """
+    Append-only tracker table that reads its rows once and dedupes in memory.
+    Rows are buffered and committed to the run state store (synced to disk) every
+    flush_rows rows or flush_seconds seconds, whichever comes first, so a crash loses
+    at most one buffer.
+
+    table -- runstate table to track, "ziptracker" or "filestracker"
+    """
+
+    def __init__(self, table, flush_rows=50, flush_seconds=30.0):
+        self.table = table
+        self.flush_rows = flush_rows
+        self.flush_seconds = flush_seconds
+
+        # Load every existing row once, tuples so they can be hashed
+        self.rows = set(tuple(row) for row in runstate.Rows(table))
+
+        self.buffer = []
+        self.last_flush = time.monotonic()
+        self.lock = threading.RLock()  # download workers share trackers
+
+    def Contains(self, row):
+        """
+        row -- list of strings
+        Return: bool, true if row has been written or is waiting in the buffer
+        """
+        return tuple(row) in self.rows
+
+    def Append(self, row, unique=True):
+        """
+        Buffers row for writing if it is not already tracked
+
+        row -- list of strings
+        unique -- bool, false to append even if an identical row is tracked
+        Return: bool, true if row was buffered
+        """
+        row = tuple(row)
+        with self.lock:
+            if unique and row in self.rows:
+                return False
+
+            self.rows.add(row)
+            self.buffer.append(row)
+
+            if (
+                len(self.buffer) >= self.flush_rows
+                or time.monotonic() - self.last_flush >= self.flush_seconds
+            ):
+                self.Flush()
+        return True
+
+    def Flush(self):
+        """
+        Commits buffered rows to the run state store
+
+        Return: void
+        """
+        with self.lock:
+            if self.buffer:
+                runstate.InsertMany(self.table, self.buffer)
+                self.buffer.clear()
+            runstate.Commit()
+            self.last_flush = time.monotonic()
+
+    def Close(self):
+        """
+        Flushes the buffer and exports the table to its csv for downstream users
+
+        Return: void
+        """
+        self.Flush()
+        runstate.ExportCsv(self.table)
+
+
+trackers = {}  # Open Tracker objects keyed by table
+trackers_lock = threading.Lock()
+
+
+def GetTracker(table):
+    """
+    Returns the Tracker for table, opening it on first use
+
+    table -- runstate table name
+    Return: Tracker
+    """
+    with trackers_lock:
+        if table not in trackers:
+            trackers[table] = Tracker(table)
+        return trackers[table]
+
+
+def FlushTrackers():
+    """
+    Forces all buffered tracker rows to disk, to be called before marking progress
+
+    Return: void
+    """
+    for tracker in list(trackers.values()):
+        tracker.Flush()
+
+
+def CloseTrackers():
+    """
+    Flushes every open tracker and rewrites ziptracker.csv and filestracker.csv
+
+    Return: void
+    """
+    DrainCompletions()  # queued ziptracker rows first
+    for tracker in trackers.values():
+        tracker.Close()
+    trackers.clear()
+
+
+atexit.register(CloseTrackers)  # Buffered rows survive an exception or interrupt
 
 
 def WriteZipTracker(key, val, page):
@@ -673,23 +1606,29 @@ def WriteZipTracker(key, val, page):
     page- page found on
     Return: void
     """
+    phasetrace.Outcome(page)
+    InOrder(AppendZipTracker, key, val, page)
+
+
+def AppendZipTracker(key, val, page):
+    """
+    Appends a ziptracker row unless it is a repeat, see WriteZipTracker
+
+    Return: void
+    """
+    tracker = GetTracker("ziptracker")
     temp = [key, val, page]
 
-    # If row exists we will not write it, and break out
-    with open("./trackers/ziptracker.csv", "r", newline="") as file:
-        reader = csv.reader(file)
+    with tracker.lock:  # check and append as one step across workers
+        # If row exists we will not write it, and break out
         if page != "SK":
-            for row in reader:
-                if row == temp:
-                    return 0
-        else:  # If a file is already NA, a revisit should not be appended as SK
-            for row in reader:
-                if [temp[0], temp[1], "NA"] == row:
-                    return 0
-
-    with open("./trackers/ziptracker.csv", "a", newline="") as file:
-        writer = csv.writer(file)
-        writer.writerow(temp)
+            if tracker.Contains(temp):
+                return 0
+        else:  # If a file is already NA, a revisit should not be appended as SK, repeated SKs are kept
+            if tracker.Contains([temp[0], temp[1], "NA"]):
+                return 0
+
+        tracker.Append(temp, unique=False)
 
 
 def WriteFilesTracker(key, val, row_number, page_number, filing_date, doc_type):
@@ -703,43 +1642,541 @@ def WriteFilesTracker(key, val, row_number, page_number, filing_date, doc_type):
     doc_type -- type of document (should always be annual report but we wanna make sure)
     Return: void
     """
-    # Check if file exists
-    temp = [
-        str(key),
-        str(val),
-        str(row_number),
-        str(page_number),
-        str(filing_date),
-        str(doc_type),
-    ]
-    with open("./trackers/filestracker.csv", "r", newline="") as file:
-        reader = csv.reader(file)
-        for row in reader:
-            if row == temp:
-                return 0
+    # Appended only if the row is not already tracked
+    GetTracker("filestracker").Append(
+        [
+            str(key),
+            str(val),
+            str(row_number),
+            str(page_number),
+            str(filing_date),
+            str(doc_type),
+        ]
+    )
 
-    # If file doesnt exist, append
-    with open("./trackers/filestracker.csv", "a", newline="") as file:
-        writer = csv.writer(file)
-        writer.writerow(temp)
 
+class RateScheduler:
+    """
+    Keeps every rolling window of downloads under the mergent archives throttle.
+    Each download is recorded as (time, kb), and a new download waits only until enough old
+    downloads have left the window for it to fit, instead of a flat hour once a counter fills.
+    Thread safe, one scheduler is shared by every download worker.
+
+    cap_kb -- kb allowed in any window
+    window_seconds -- length of the rolling window
+    """
+
+    def __init__(self, cap_kb=1800000.0, window_seconds=3600):
+        self.cap_kb = cap_kb
+        self.window_seconds = window_seconds
+        self.history = deque()  # [start time, kb] per download, oldest first
+        self.condition = threading.Condition()
+        self.seeded = False  # zips on disk counted, see Seed
+
+    def Delay(self, kb, now=None):
+        """
+        Minimum wait before a download of kb keeps every window under the cap
+
+        kb -- expected size of the download
+        now -- time.time() value, defaults to the current time
+        Return: seconds to wait, 0 if the download can start now
+        """
+        if now is None:
+            now = time.time()
+
+        with self.condition:
+            # Downloads older than the window no longer count
+            while self.history and self.history[0][0] <= now - self.window_seconds:
+                self.history.popleft()
+
+            total = sum(size for start, size in self.history)
+            if total + kb <= self.cap_kb:
+                return 0.0
+
+            # Wait until the oldest downloads expire, a download over the cap needs an empty window
+            for start, size in self.history:
+                total -= size
+                if total + kb <= self.cap_kb or total == 0:
+                    return max(0.0, start + self.window_seconds - now)
+            return 0.0
+
+    def Acquire(self, bar, kb):
+        """
+        Blocks until a download of kb fits, then records it as started
+
+        bar -- progress bar for status text
+        kb -- expected size of the download
+        Return: history entry, to be passed to Settle once the real size is known
+        """
+        with self.condition:
+            delay = self.Delay(kb)
+            while delay > 0:
+                bar.text("Waiting " + str(round(delay / 60.0, 1)) + " minutes...")
+                self.condition.wait(delay)
+                delay = self.Delay(kb)
+
+            entry = [time.time(), kb]
+            self.history.append(entry)
+            return entry
+
+    def Settle(self, entry, kb):
+        """
+        Replaces an acquired estimate with the size actually downloaded
+
+        entry -- return of Acquire
+        kb -- kb downloaded
+        Return: void
+        """
+        with self.condition:
+            entry[1] = kb
+            self.condition.notify_all()  # a smaller download may let others start sooner
+
+    def Wait(self, bar):
+        """
+        Blocks while the current window is already at the cap
+
+        bar -- progress bar for status text
+        Return: void
+        """
+        with self.condition:
+            delay = self.Delay(0)
+            while delay > 0:
+                bar.text("Waiting " + str(round(delay / 60.0, 1)) + " minutes...")
+                self.condition.wait(delay)
+                delay = self.Delay(0)
+
+    def Seed(self, directory):
+        """
+        Records zips in directory modified within the window, so a restart still counts
+        what the previous run downloaded in the last hour. Only the first call counts them,
+        later zips on disk were downloaded through this scheduler and are already recorded.
+
+        directory -- zips folder
+        Return: void
+        """
+        cutoff = time.time() - self.window_seconds
+        with self.condition:
+            if self.seeded:
+                return
+            self.seeded = True
+
+            seeded = [
+                [file.stat().st_mtime, file.stat().st_size / 1024]
+                for file in os.scandir(directory)
+                if file.is_file() and file.stat().st_mtime > cutoff
+            ]
+            # Delay expects the oldest download first
+            self.history = deque(
+                sorted(list(self.history) + seeded, key=lambda entry: entry[0])
+            )
+
+
+scheduler = RateScheduler()  # Shared by SearchActions, ResultActions, download workers and TertiaryCheck
+download_oversize = True  # pages over the cap are downloaded alone in an empty window, False marks them TL
+
+
+def TooLarge(page_size):
+    """
+    page_size -- kb listed for a page
+    Return: bool, true if the page is marked TL instead of downloaded
+    """
+    return page_size > scheduler.cap_kb and not download_oversize
+
+
+def PlannedSizes(key, val):
+    """
+    Sizes of the pages a firm's search would download, from cached search results
+
+    key -- company key
+    val -- company name
+    Return: list of kb per page still to download, None if the search is not cached
+    """
+    search_all = False
+    plan = PlanFromCache(key, val, search_all)
+    if plan is not None and plan["report_count"] == "0":
+        search_all = True  # no annual reports, the unfiltered search is what downloads
+        plan = PlanFromCache(key, val, search_all)
+    if plan is None:
+        return None
+
+    first_page = NextPage(key, search_all)
+    return [size for page, size in plan["sizes"].items() if page >= first_page]
+
+
+def PlanDownloads(firms):
+    """
+    Orders firms so each rolling window of downloads is packed close to the cap.
+    Firms whose searches are cached are packed into windows first fit, largest first, with a firm over
+    the cap (or with a page over it) starting a window of its own. Firms with nothing cached or nothing
+    to download are spread between the windows, so their searches run while the scheduler would
+    otherwise wait for the window to roll over.
+
+    firms -- list of (firm index, company key, company name)
+    Return: list of the same firms in download order
+    """
+    cap = scheduler.cap_kb
+    sized = []  # (kb, firm)
+    fill = []  # firms of unknown or no size, in index order
+    for firm in firms:
+        sizes = PlannedSizes(firm[1], firm[2])
+        if sizes:
+            sized.append((sum(sizes), firm))
+        else:
+            fill.append(firm)
+
+    windows = []  # [kb, firms] per window
+    for kb, firm in sorted(sized, key=lambda item: -item[0]):
+        for window in windows:
+            if window[0] + kb <= cap:
+                window[0] += kb
+                window[1].append(firm)
+                break
+        else:
+            windows.append([kb, [firm]])
+
+    ordered = []
+    share = -(-len(fill) // max(1, len(windows)))  # fill firms after each window, rounded up
+    for number, (kb, window_firms) in enumerate(windows):
+        ordered += sorted(window_firms)
+        ordered += fill[number * share : (number + 1) * share]
+    ordered += fill[len(windows) * share :]
+
+    print(
+        "Planned "
+        + str(len(sized))
+        + " cached firms ("
+        + str(round(sum(kb for kb, firm in sized) / 1000000.0, 2))
+        + "GB) into "
+        + str(len(windows))
+        + " windows, "
+        + str(len(fill))
+        + " firms with nothing cached to download between them"
+    )
+    return ordered
+
+
+def ScheduledDownload(driver, bar, filename, search_all, page_size, job=None):
+    """
+    Asks the scheduler for room before a bulk download, then records its real size
+    and queues the zip for a background integrity check
+
+    driver -- webdriver on a search results page
+    bar -- progress bar
+    filename -- GenFileName result, nothing is downloaded if empty
+    search_all -- bool, passed to BulkDownload
+    page_size -- kb listed for the page
+    job -- (key, val, search_all, specific_years) searched again by RetryBadZips if the zip is bad
+    Return: size of zip file downloaded
+    """
+    if not filename:
+        return 0
+
+    if pipelined:
+        with phasetrace.Phase("throttle"):
+            in_flight.acquire()  # at most pipeline_depth downloads unfinished
+    with phasetrace.Phase("throttle"):
+        entry = scheduler.Acquire(bar, page_size)
+
+    if not pipelined:
+        zipsize = 0
+        try:
+            zipsize = BulkDownload(driver, filename, search_all)
+        finally:
+            scheduler.Settle(entry, zipsize)
+        QueueZipCheck(filename, job, zipsize)
+        return zipsize
 
-def CheckAndWait(bar, amt_downloaded_kb):
-    # 1.8 gb cap TEMP
-    if amt_downloaded_kb >= 1800000.0:  # Cap for mergent archives download throttle
-        bar.text("Waiting...")
-        time.sleep(
-            3660  # 1 hour 1 minute stall
-        )  # When we reach safe threshold, we wait an hour to prevent lockout
-        amt_downloaded_kb = 0.0
+    try:
+        complete = BulkDownload(driver, filename, search_all, wait=False)
+    except:
+        scheduler.Settle(entry, 0)
+        in_flight.release()
+        raise
 
-    return amt_downloaded_kb
+    records = phasetrace.Capture()  # Finish runs on the completion thread, which has no records open
 
+    def Finish():
+        global pipelined_kb
+        zipsize = 0
+        try:
+            with phasetrace.Attach(records):
+                zipsize = complete()
+        finally:
+            phasetrace.Release(records)
+            scheduler.Settle(entry, zipsize)
+            in_flight.release()
+            pipelined_kb += zipsize
+        QueueZipCheck(filename, job, zipsize)
 
-def GetIndices(size):
+    InOrder(Finish)
+    return 0  # counted in pipelined_kb once complete
+
+
+def QueueZipCheck(filename, job, zipsize):
+    """
+    Hands a completed download to zipcheck without waiting on it
+
+    filename -- GenFileName result
+    job -- passed back by RetryBadZips
+    zipsize -- kb downloaded, nothing is checked if 0
+    Return: void
+    """
+    if zipsize > 0:
+        path = os.path.join(GetDownloadDirectory(), filename.replace(" ", "-") + ".zip")
+        zipcheck.Submit(path, job, zipsize * 1024)
+
+
+def RetryBadZips(driver, bar, total_download):
+    """
+    Waits for the background zip checks, sets bad zips aside as .zip.bad and searches their
+    firms again, which downloads only the pages missing from the inventory. Runs once, zips
+    still bad afterwards are set aside and listed.
+
+    driver -- authenticated webdriver
+    bar -- progress bar
+    total_download -- kb downloaded so far
+    Return: total download in kb
+    """
+
+    def SetAside(bad_zips):
+        for path, job, error in bad_zips:
+            print("Bad zip " + os.path.basename(path) + ": " + error)
+            if os.path.exists(path):
+                os.replace(path, path + ".bad")
+            parsed = ParseZipName(os.path.basename(path))
+            if parsed is not None:
+                with inventory_lock:
+                    inventory.pop(parsed[0], None)
+
+    zipcheck.Wait()
+    bad_zips = zipcheck.TakeBad()
+    SetAside(bad_zips)
+
+    jobs = []
+    for path, job, error in bad_zips:
+        if job is not None and job not in jobs:
+            jobs.append(job)
+
+    for key, val, search_all, specific_years in jobs:
+        Journal().ForgetPages(key)  # walk every page again, good pages are skipped as on disk
+        with phasetrace.Firm(key, val):
+            total_download = SearchActions(
+                driver, bar, key, val, total_download, search_all, specific_years
+            )
+
+    DrainCompletions()
+    zipcheck.Wait()
+    SetAside(zipcheck.TakeBad())
+    print(
+        "Zip checks: "
+        + zipcheck.Report()
+        + ", "
+        + str(len(jobs))
+        + " firms downloaded again"
+    )
+    return total_download
+
+
+retry_attempts = 3  # failed searches of a firm before it is written SK
+retry_backoff = 60  # seconds before the first retry of a firm, doubled for each retry after
+retry_queue = {}  # company key: entry of a firm waiting to be searched again
+failures = {}  # company key: failed searches this run
+retry_counts = {}  # error or outcome: count, for RetrySummary
+retry_lock = threading.Lock()
+
+
+def SkipFirm(key, val, error, page, search_all, specific_years=[]):
+    """
+    Handles a search that timed out or lost its grid. The firm is queued to be searched again
+    after a backoff, and written SK only once it has failed retry_attempts times.
+
+    key -- company key
+    val -- company name
+    error -- short description of the failure, counted in RetrySummary
+    page -- page the search failed on, 0 before the results page
+    search_all -- bool, search that failed
+    Return: void
+    """
+    with retry_lock:
+        failures[key] = failures.get(key, 0) + 1
+        retry_counts[error] = retry_counts.get(error, 0) + 1
+        if failures[key] < retry_attempts:
+            retry_queue[key] = {
+                "index": None,
+                "val": val,
+                "search_all": search_all,
+                "specific_years": specific_years,
+                "page": page,
+                "error": error,
+                "due": time.time() + retry_backoff * 2 ** (failures[key] - 1),
+            }
+            return
+        retry_counts["written SK"] = retry_counts.get("written SK", 0) + 1
+
+    WriteZipTracker(key, val, "SK")
+
+
+def AwaitingRetry(index, key):
+    """
+    Checks whether a firm just searched is queued for a retry, which then completes it
+
+    index -- firm index, passed to StoreIndex once the retry finishes, None for firms not journaled
+    key -- company key
+    Return: bool, true if the firm must not be stored as complete yet
+    """
+    with retry_lock:
+        if key in retry_queue:
+            retry_queue[key]["index"] = index
+            return True
+    return False
+
+
+def RetrySkipped(driver, bar, total_download, reopen, wait=True):
+    """
+    Searches queued firms again, each in a new browser, oldest due first
+
+    driver -- authenticated webdriver, quit before each retry
+    bar -- progress bar
+    total_download -- kb downloaded so far
+    reopen -- function returning a new authenticated webdriver
+    wait -- bool, true waits for every queued retry, false retries only the firms already due
+    Return: tuple (webdriver, total download in kb)
+    """
+    while True:
+        with retry_lock:
+            if not retry_queue:
+                break
+            key = min(retry_queue, key=lambda key: retry_queue[key]["due"])
+            delay = retry_queue[key]["due"] - time.time()
+            if delay > 0 and not wait:
+                break
+            entry = retry_queue.pop(key)
+
+        if delay > 0:
+            bar.text("Retrying a skipped firm in " + str(round(delay / 60.0, 1)) + " minutes...")
+            time.sleep(delay)
+
+        # A new browser, quitting would cancel downloads still in flight
+        DrainCompletions()
+        driver.quit()
+        driver = reopen()
+
+        with phasetrace.Firm(key, entry["val"]):
+            total_download = SearchActions(
+                driver,
+                bar,
+                key,
+                entry["val"],
+                total_download,
+                entry["search_all"],
+                entry["specific_years"],
+            )
+
+        if AwaitingRetry(entry["index"], key):
+            continue  # failed again, queued with a longer backoff
+        with retry_lock:
+            if failures[key] < retry_attempts:
+                retry_counts["recovered"] = retry_counts.get("recovered", 0) + 1
+        if entry["index"] is not None:
+            StoreIndex(entry["index"], key)
+
+    return driver, total_download
+
+
+def GiveUpRetries():
+    """
+    Writes SK for firms still queued, such as firms whose bad zip search failed after RetrySkipped
+
+    Return: void
+    """
+    with retry_lock:
+        entries = list(retry_queue.items())
+        retry_queue.clear()
+        retry_counts["written SK"] = retry_counts.get("written SK", 0) + len(entries)
+
+    for key, entry in entries:
+        WriteZipTracker(key, entry["val"], "SK")
+        if entry["index"] is not None:
+            StoreIndex(entry["index"], key)
+
+
+def RetrySummary():
+    """
+    Return: string with firms retried and the count of each failure and outcome
+    """
+    with retry_lock:
+        retried = len(failures)
+        counts = ", ".join(
+            name + " " + str(count) for name, count in sorted(retry_counts.items())
+        )
+    return str(retried) + " firms failed a search" + (", " + counts if counts else "")
+
+
+# Let the browser search the next pages and firms while bulk downloads finish. Chrome and the
+# HTTP pool keep downloading while the tab navigates, so each download is completed, and every
+# ziptracker row and checkpoint after it is written, in order on completion_queue.
+pipelined = False
+pipeline_depth = 2  # downloads left unfinished at once when pipelined
+in_flight = threading.BoundedSemaphore(pipeline_depth)
+pipelined_kb = 0.0  # kb of downloads completed on completion_queue
+
+completion_queue = ThreadPoolExecutor(max_workers=1)  # one thread keeps submission order
+completion_errors = []  # exceptions raised on completion_queue, raised again by DrainCompletions
+
+
+def EnablePipeline(depth=None):
+    """
+    Turns on pipelined downloads
+
+    depth -- optional downloads left unfinished at once, defaults to pipeline_depth
+    Return: void
+    """
+    global pipelined, pipeline_depth, in_flight
+    pipeline_depth = depth or pipeline_depth
+    in_flight = threading.BoundedSemaphore(pipeline_depth)
+    pipelined = True
+
+
+def InOrder(function, *args):
+    """
+    Runs function now, or when pipelined, on completion_queue after everything queued before it
+
+    Return: void
+    """
+    if not pipelined:
+        function(*args)
+        return
+
+    def Run():
+        try:
+            function(*args)
+        except Exception as error:
+            completion_errors.append(error)
+
+    completion_queue.submit(Run)
+
+
+def DrainCompletions():
+    """
+    Waits for every queued download completion and tracker write, to be called before a driver quits
+
+    Return: void
+    """
+    if not pipelined:
+        return
+    try:
+        completion_queue.submit(lambda: None).result()
+    except RuntimeError:
+        pass  # interpreter exiting, the queue already ran everything before shutting down
+    if completion_errors:
+        raise completion_errors.pop(0)
+
+
+def GetIndices(size, namespace=None):
     """
     Prompt user for Indices for use as parameters for search, both inclusive
     size- int max value
+    namespace -- checkpoint journal 'c' continues from
     Return: two ints, first is starting index, second is ending_index
     """
     # Loop until input is valid
@@ -764,118 +2201,416 @@ def GetIndices(size):
         elif starting_index == "c" and ending_index.isnumeric():
             ending_index = int(ending_index)
             if (ending_index >= 1 and ending_index <= size) and (
-                GetIndex() <= ending_index
+                GetIndex(namespace) <= ending_index
             ):
-                starting_index = GetIndex()
+                starting_index = max(1, GetIndex(namespace))
                 break  # If within safe bounds, return
         print("Error: One or more entries invalid")
     return starting_index, ending_index
 
 
-def StoreIndex(val):
+# Checkpoint journal of this process, main gives each shard its own
+journal_namespace = "download"
+
+
+def Journal(namespace=None):
+    """
+    namespace -- checkpoint journal, defaults to journal_namespace
+    Return: checkpoint.Journal
+    """
+    return checkpoint.Open(namespace or journal_namespace)
+
+
+def StoreIndex(val, key="", namespace=None):
     """
-    Overwrites value in lastindex.txt if new value is greater
+    Records a firm as complete in the checkpoint journal, once its tracker rows are on disk
 
-    val -- int of index to overwrite with
+    val -- int of firm index completed
+    key -- company key, clears the firm's page checkpoints
+    namespace -- checkpoint journal, defaults to journal_namespace
     Return: void
     """
-    if val > GetIndex():
-        f = open("lastindex.txt", "w")
-        f.write(str(val))
-        f.close()
 
+    def AppendFirm():
+        FlushTrackers()
+        Journal(namespace).CompleteFirm(val, key)
 
-def GetIndex():
+    InOrder(AppendFirm)
+
+
+def GetIndex(namespace=None):
     """
     Returns the index left off on by the last run
 
-    Return: int index of last download
+    namespace -- checkpoint journal, defaults to journal_namespace
+    Return: int index of last firm with every earlier firm complete
     """
-    f = open("lastindex.txt", "r")
-    ret = int(f.read())
-    f.close()
-    return ret
+    return Journal(namespace).LastIndex()
+
+
+def FirmDone(val, namespace=None):
+    """
+    val -- int firm index
+    namespace -- checkpoint journal, defaults to journal_namespace
+    Return: bool, true if the firm was completed by an earlier run
+    """
+    return Journal(namespace).FirmDone(val)
+
+
+def CompletePage(key, search_all, page, specific_years=[]):
+    """
+    Records a results page as complete, once its tracker rows are on disk
+
+    key -- company key
+    search_all -- bool, false for annual report searches
+    page -- int page number
+    specific_years -- years a tertiary check searched for
+    Return: void
+    """
+    InOrder(AppendPage, key, SearchKind(search_all, specific_years), page)
+
+
+def AppendPage(key, search_kind, page):
+    """
+    Flushes trackers then journals a page, see CompletePage
+
+    Return: void
+    """
+    FlushTrackers()
+    Journal().CompletePage(key, search_kind, page)
+
+
+def NextPage(key, search_all, specific_years=[]):
+    """
+    key -- company key
+    search_all -- bool, false for annual report searches
+    specific_years -- years a tertiary check searched for
+    Return: int, first page of the search not completed by an earlier run
+    """
+    return Journal().NextPage(
+        key, SearchKind(search_all, specific_years)
+    )
 
 
-def ResetIndex(query):
+def SearchKind(search_all, specific_years=[]):
     """
-    Optional queries then resets lastindex.txt to 0 if accepted
+    Return: "ANR", "ALL" or "ALL" with the tertiary check's years, the search a page belongs to
+    """
+    if specific_years:
+        return "ALL " + " ".join(specific_years)
+    return "ALL" if search_all else "ANR"
+
+
+def ResetIndex(query, namespace=None):
+    """
+    Optional queries then resets the checkpoint journal if accepted
     query- bool if we would like to query
+    namespace -- checkpoint journal, defaults to journal_namespace
     Return: void or 0
     """
     if query:
         ans = input("Reset stored index? (Y/N)")
         if ans == "Y":
-            f = open("lastindex.txt", "w")
-            f.write(str(0))
-            f.close()
+            Journal(namespace).Reset()
         elif ans == "N":
             return 0  # break
         else:
             print("Invalid, enter Y or N")
-            ResetIndex(True)  # try again if not Y or N
+            ResetIndex(True, namespace)  # try again if not Y or N
     else:
-        f = open("lastindex.txt", "w")
-        f.write(str(0))
-        f.close()
+        Journal(namespace).Reset()
 
 
-def main():
+auth_url = "https://auth.msu.edu/app/msu_libezproxy1_1/exk9lztnrdDlyj27O357/sso/saml"
 
-    # Create company dictionary for iteration
-    companyDict = GetDict()
 
-    # Query for index reset
-    ResetIndex(True)
-
-    # Gather search parameters
-    starting_index, ending_index = GetIndices(len(companyDict))
+def OpenSession(credentials, profile="browser1"):
+    """
+    Creates a Webdriver and completes authorization if it is redirected, prompting for credentials once
 
-    # Create Webdriver and tracker files
-    driver = CreateDriver()
-    CreateTrackers()
+    credentials -- list, empty until the first prompt fills it with [user, password]
+    profile -- chrome profile name, see CreateDriver
+    Return: Webdriver on mergent archives
+    """
+    driver = CreateDriver(profile=profile)
 
     # Typically takes under a second to redirect if authorization needed
     time.sleep(1)
 
-    if (
-        driver.current_url  # Authentication
-        == "https://auth.msu.edu/app/msu_libezproxy1_1/exk9lztnrdDlyj27O357/sso/saml"
-    ):
-        # Obtain valid credentials for log in
-        msuUser = input("Input a valid msu email to access mergent archives.\n")
-        msuPass = getpass("Input a valid msu password.\n")
-        CompleteAuth(driver, msuUser, msuPass)  # Execute authorization page actions
+    if driver.current_url == auth_url:  # Authentication
+        if not credentials and os.environ.get("MSU_EMAIL") and os.environ.get("MSU_PASSWORD"):
+            # Non interactive runs pass credentials through the environment
+            credentials.append(os.environ["MSU_EMAIL"])
+            credentials.append(os.environ["MSU_PASSWORD"])
+        if not credentials:
+            # Obtain valid credentials for log in
+            credentials.append(
+                input("Input a valid msu email to access mergent archives.\n")
+            )
+            credentials.append(getpass("Input a valid msu password.\n"))
+        CompleteAuth(
+            driver, credentials[0], credentials[1]
+        )  # Execute authorization page actions
+
+    return driver
+
+
+def GetWorkerCount():
+    """
+    Prompt user for the number of browsers to download with at once
+
+    Return: int, at least 1
+    """
+    while 1:
+        count = input("Input number of download workers (1 for a single browser)\n")
+        if count.isnumeric() and int(count) >= 1:
+            return int(count)
+        print("Error: entry invalid")
+
+
+def DownloadWorker(driver, firms, bar, bar_lock):
+    """
+    Runs one authenticated driver through its shard of firms
+
+    driver -- Webdriver from OpenSession
+    firms -- list of (firm index, company key, company name)
+    bar -- progress bar shared by all workers
+    bar_lock -- lock guarding bar updates
+    Return: kb downloaded by this worker
+    """
+    total_download = 0.0
+
+    try:
+        for index, key, val in firms:
+            with phasetrace.Firm(key, val):
+                total_download = SearchActions(
+                    driver, bar, key, val, total_download, False
+                )  # Execute search page actions
+
+            # firm complete, unless it failed and is queued to be searched again
+            if not AwaitingRetry(index, key):
+                StoreIndex(index, key)  # flushes trackers before the journal moves past them
+            with bar_lock:
+                bar()
+    finally:
+        DrainCompletions()  # quitting would cancel downloads still in flight
+        driver.quit()
+
+    return total_download
+
+
+def RunWorkers(drivers, firms, bar):
+    """
+    Downloads firms with one worker thread per driver, sharding firms round robin.
+    Workers share trackers and the RateScheduler so their combined downloads respect the cap.
+
+    drivers -- list of authenticated Webdrivers, one per worker
+    firms -- list of (firm index, company key, company name) in index order
+    bar -- progress bar
+    Return: kb downloaded by all workers
+    """
+    bar_lock = threading.Lock()
+    shards = [firms[x :: len(drivers)] for x in range(len(drivers))]
+
+    with ThreadPoolExecutor(max_workers=len(drivers)) as pool:
+        futures = [
+            pool.submit(DownloadWorker, driver, shard, bar, bar_lock)
+            for driver, shard in zip(drivers, shards)
+        ]
+        total_download = sum(future.result() for future in futures)
+
+    return total_download
+
+
+def ParseArgs(argv=None):
+    """
+    Reads command line options, a run given none of --start, --end, --continue or --shard prompts as before
+
+    argv -- list of arguments, defaults to sys.argv
+    Return: argparse.Namespace
+    """
+    parser = argparse.ArgumentParser(
+        description="Downloads annual reports of the firms in ARC_HH_OK_AR_missing.csv from Mergent Archives"
+    )
+    parser.add_argument("--start", type=int, help="first firm index, 1 based")
+    parser.add_argument("--end", type=int, help="last firm index, inclusive")
+    parser.add_argument(
+        "--continue",
+        dest="resume",
+        action="store_true",
+        help="start from the last firm index stored, within the shard when used with --shard",
+    )
+    parser.add_argument(
+        "--shard",
+        help="i/N, download only the i-th of N contiguous blocks of the range, each shard keeps its own checkpoint journal",
+    )
+    parser.add_argument("--workers", type=int, default=1, help="browsers to download with")
+    parser.add_argument("--reset", action="store_true", help="reset the checkpoint journal first")
+    parser.add_argument("--http", action="store_true", help="use the HTTP download transport")
+    parser.add_argument(
+        "--pipeline",
+        type=int,
+        nargs="?",
+        const=pipeline_depth,
+        metavar="DEPTH",
+        help="search ahead while up to DEPTH bulk downloads finish",
+    )
+    parser.add_argument(
+        "--plan",
+        action="store_true",
+        help="order firms by cached page sizes so each hour of downloads is packed to the cap",
+    )
+    parser.add_argument("--base-url", help="site to search instead of Mergent Archives")
+    args = parser.parse_args(argv)
+
+    args.interactive = (
+        args.start is None and args.end is None and not args.resume and args.shard is None
+    )
+
+    args.shard_number, args.shard_count = 1, 1
+    if args.shard is not None:
+        shard = args.shard.split("/")
+        if (
+            len(shard) != 2
+            or not shard[0].isnumeric()
+            or not shard[1].isnumeric()
+            or not 1 <= int(shard[0]) <= int(shard[1])
+        ):
+            parser.error("--shard must be i/N with 1 <= i <= N")
+        args.shard_number, args.shard_count = int(shard[0]), int(shard[1])
+
+    if args.workers < 1:
+        parser.error("--workers must be at least 1")
+    return args
+
+
+def main():
+    global journal_namespace, use_http_transport, mergent_url
+
+    args = ParseArgs()
+    use_http_transport = use_http_transport or args.http
+    if args.base_url:
+        mergent_url = args.base_url.rstrip("/")
+    if args.pipeline:
+        EnablePipeline(args.pipeline)
+    if args.shard_count > 1:
+        journal_namespace = (
+            "download-" + str(args.shard_number) + "of" + str(args.shard_count)
+        )
+
+    # Ordered unique firms for iteration, Key=Company Key, Val=clicked term
+    firm_list = GetFirmList()
+
+    if args.interactive:
+        # Query for index reset
+        ResetIndex(True)
+
+        # Gather search parameters
+        starting_index, ending_index = GetIndices(len(firm_list))
+        worker_count = GetWorkerCount()
+
+    else:
+        if args.reset:
+            ResetIndex(False)
+
+        ending_index = args.end or len(firm_list)
+        starting_index = args.start if args.start is not None else 1
+
+        if not 1 <= starting_index <= ending_index <= len(firm_list):
+            raise SystemExit(
+                "Error: firm range must be within 1-" + str(len(firm_list))
+            )
+        # Shards are split from the full range, so every worker gets the same blocks on every run
+        starting_index, ending_index = ShardRange(
+            starting_index, ending_index, args.shard_number, args.shard_count
+        )
+        if args.resume and args.start is None:
+            # Left off point of this shard's own journal, which never leaves its block
+            starting_index = max(starting_index, GetIndex())
+        worker_count = args.workers
+
+    # Firms in range not completed by an earlier run or already on disk
+    CreateTrackers()
+    LoadInventory()
+    on_disk = FirmsOnDisk()
+    in_range = firm_list[starting_index - 1 : ending_index]
+    firms = [
+        (index, key, val)
+        for index, (key, val) in enumerate(in_range, starting_index)
+        if not FirmDone(index) and key not in on_disk
+    ]
+    if args.plan:
+        firms = PlanDownloads(firms)
+
+    # One authenticated Webdriver per worker, shards on one machine need their own profiles
+    scheduler.Seed(GetDownloadDirectory())  # count zips from a run in the last hour
+    profile_prefix = "browser" if args.shard_count == 1 else journal_namespace + "-browser"
+    credentials = []
+    drivers = [
+        OpenSession(credentials, profile_prefix + str(x + 1))
+        for x in range(worker_count)
+    ]
+    driver = drivers[0]
+
+    def Reopen():
+        return OpenSession(credentials, profile_prefix + "1")
 
     # Initialize loop variables
-    amt_downloaded_kb = 0  # needs to stay under 1800000 kb #should be zero
-    curr_firm = 1  # Start on first firm
+    amt_downloaded_kb = 0  # total kb downloaded this run, the cap is kept by scheduler
 
     # Progress bar to visualize download eta
-    with alive_bar(len(companyDict)) as bar:
+    with alive_bar(len(firm_list)) as bar:
 
         bar.text("Starting...")
         bar()  # start on 1
+        bar(len(firm_list) - len(firms))  # firms outside the range or already done
 
-        # Key=Company Key, Val=clicked term
-        for key, val in companyDict.items():
-            if (curr_firm >= starting_index) and (curr_firm <= ending_index):
+        if worker_count > 1:
+            amt_downloaded_kb = RunWorkers(drivers, firms, bar)
 
-                amt_downloaded_kb = CheckAndWait(
-                    bar, amt_downloaded_kb
-                )  # Will wait an hour on trigger and reset amt to 0
+            # Workers have quit their browsers, skipped firms and bad zips are retried in a new one
+            zipcheck.Wait()
+            if zipcheck.bad or retry_queue:
+                driver = Reopen()
+                driver, amt_downloaded_kb = RetrySkipped(
+                    driver, bar, amt_downloaded_kb, Reopen
+                )
+                amt_downloaded_kb = RetryBadZips(driver, bar, amt_downloaded_kb)
+                GiveUpRetries()
+                driver.quit()
 
-                amt_downloaded_kb = SearchActions(
-                    driver, bar, key, val, amt_downloaded_kb, False
-                )  # Execute search page actions
+        else:
+            for index, key, val in firms:
+                with phasetrace.Firm(key, val):
+                    amt_downloaded_kb = SearchActions(
+                        driver, bar, key, val, amt_downloaded_kb, False
+                    )  # Execute search page actions
+
+                # firm complete, unless it failed and is queued to be searched again
+                if not AwaitingRetry(index, key):
+                    StoreIndex(index, key)  # mark completion, trackers are flushed first
 
-                # firm complete
-                StoreIndex(curr_firm)  # mark completion
+                bar()  # update bar progress after each company
 
-            curr_firm += 1
-            bar()  # update bar progress after each company
+                # Firms whose backoff has passed are searched again in a new browser
+                driver, amt_downloaded_kb = RetrySkipped(
+                    driver, bar, amt_downloaded_kb, Reopen, wait=False
+                )
+
+            driver, amt_downloaded_kb = RetrySkipped(
+                driver, bar, amt_downloaded_kb, Reopen
+            )
+            DrainCompletions()  # quitting would cancel downloads still in flight
+            amt_downloaded_kb = RetryBadZips(driver, bar, amt_downloaded_kb)
+            GiveUpRetries()
+            driver.quit()
+    CloseTrackers()
+    amt_downloaded_kb += pipelined_kb
     print("Complete, " + str(amt_downloaded_kb / 1000000.0) + " downloaded.")
-    driver.quit()
+    print("Transfers: " + TransferSummary())
+    print("Waits:\n" + WaitSummary())
+    print("Retries: " + RetrySummary())
+    print("Phase timings written to " + phasetrace.trace_path + ", summarize with python phasetrace.py")
 
 
 if __name__ == "__main__":
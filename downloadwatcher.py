@@ -0,0 +1,241 @@
+"""
+Ties each bulk download to the file it produced, replacing the glob and mtime polling
+of the whole zips folder.
+
+Before the download button is clicked, Arm points Chrome's downloads (through the DevTools
+Browser.setDownloadBehavior command) at a fresh staging folder used by that download alone,
+and starts watching it. On Linux the folder is watched with inotify, so Wait returns as soon
+as Chrome closes and renames the finished file. Elsewhere the folder is polled, which is
+still cheap since it only ever holds one file.
+"""
+
+import ctypes
+import ctypes.util
+import os
+import select
+import shutil
+import struct
+import time
+import uuid
+
+# Extensions Chrome uses while a download is incomplete
+PARTIAL_EXTENSIONS = (".crdownload", ".tmp")
+
+# inotify constants from <sys/inotify.h>
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+EVENT_HEADER = struct.Struct("iIII")  # wd, mask, cookie, len
+
+try:
+    libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+    libc.inotify_init1
+except (OSError, AttributeError, TypeError):
+    libc = None  # Not on Linux, fall back to polling
+
+
+def IsPartial(name):
+    """
+    name -- file name
+    Return: bool, true if the name belongs to a download still in progress
+    """
+    return name.endswith(PARTIAL_EXTENSIONS)
+
+
+class DownloadWatcher:
+    """
+    Watches one staging folder until the download inside it completes
+
+    directory -- empty folder the download will be written to
+    start_timeout -- seconds to wait for the download to appear before giving up
+    stall_timeout -- seconds a started download may go without growing before giving up
+    poll_seconds -- interval between checks when inotify is unavailable
+    """
+
+    def __init__(self, directory, start_timeout=60.0, stall_timeout=300.0, poll_seconds=0.25):
+        self.directory = directory
+        self.start_timeout = start_timeout
+        self.stall_timeout = stall_timeout
+        self.poll_seconds = poll_seconds
+
+        self.path = None  # completed file
+        self.bytes = 0
+        self.seconds = 0.0
+
+        self.fd = -1
+        if libc is not None:
+            self.fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+            if self.fd >= 0 and (
+                libc.inotify_add_watch(
+                    self.fd,
+                    os.fsencode(directory),
+                    IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE,
+                )
+                < 0
+            ):
+                os.close(self.fd)
+                self.fd = -1
+
+        self.armed = time.monotonic()
+
+    def Events(self, timeout):
+        """
+        Reads inotify events, blocking up to timeout seconds
+
+        Return: list of (mask, name) tuples
+        """
+        ready = select.select([self.fd], [], [], timeout)[0]
+        if not ready:
+            return []
+
+        events = []
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return events
+
+        offset = 0
+        while offset < len(data):
+            wd, mask, cookie, length = EVENT_HEADER.unpack_from(data, offset)
+            offset += EVENT_HEADER.size
+            name = data[offset : offset + length].rstrip(b"\0")
+            offset += length
+            events.append((mask, os.fsdecode(name)))
+        return events
+
+    def HasData(self, name):
+        """
+        Return: bool, true if file name in the staging folder is not empty, unlike chrome's placeholder
+        """
+        try:
+            return os.path.getsize(os.path.join(self.directory, name)) > 0
+        except OSError:
+            return False  # renamed or removed since it was listed
+
+    def Written(self):
+        """
+        Return: int, bytes written to the staging folder so far, partial files included
+        """
+        written = 0
+        for name in os.listdir(self.directory):
+            try:
+                written += os.path.getsize(os.path.join(self.directory, name))
+            except OSError:
+                pass  # renamed or removed since it was listed
+        return written
+
+    def Completed(self):
+        """
+        Lists the staging folder for a finished file
+
+        Return: tuple (name of finished, non empty file with no partial file beside it or None,
+                bool true if any file exists)
+        """
+        names = os.listdir(self.directory)
+        partials = [name for name in names if IsPartial(name)]
+        finished = [
+            name for name in names if not IsPartial(name) and self.HasData(name)
+        ]
+
+        if finished and not partials:
+            return finished[0], True
+        return None, bool(names)
+
+    def Wait(self):
+        """
+        Blocks until the download is complete
+
+        Return: path to the finished file, None if no download started within start_timeout
+                or it stopped growing for stall_timeout, such as a partial file left by an
+                interrupted transfer
+        """
+        started = False
+        written = -1
+        grew = self.armed  # time written last changed
+
+        while self.path is None:
+            now = time.monotonic()
+            if not started and now - self.armed > self.start_timeout:
+                return None
+
+            if started:
+                current = self.Written()
+                if current != written:
+                    written, grew = current, now
+                elif now - grew > self.stall_timeout:
+                    return None
+
+            if self.fd >= 0:
+                for mask, name in self.Events(1.0):
+                    started = True
+                    if mask & (IN_MOVED_TO | IN_CLOSE_WRITE) and not IsPartial(name):
+                        # Chrome writes an empty placeholder at the final name first,
+                        # the download is only done once no partial file is left
+                        name, exists = self.Completed()
+                        if name:
+                            self.path = os.path.join(self.directory, name)
+                            break
+            else:
+                name, exists = self.Completed()
+                started = started or exists
+                if name:
+                    self.path = os.path.join(self.directory, name)
+                else:
+                    time.sleep(self.poll_seconds)
+
+        self.seconds = time.monotonic() - self.armed
+        self.bytes = os.path.getsize(self.path)
+        return self.path
+
+    def Throughput(self):
+        """
+        Return: float, bytes per second of the completed download
+        """
+        if self.seconds <= 0:
+            return 0.0
+        return self.bytes / self.seconds
+
+    def Report(self):
+        """
+        Return: string summary of the completed download
+        """
+        return (
+            str(round(self.bytes / 1000000.0, 2))
+            + "MB in "
+            + str(round(self.seconds, 1))
+            + "s ("
+            + str(round(self.Throughput() / 1000000.0, 2))
+            + "MB/s)"
+        )
+
+    def Close(self):
+        """
+        Stops watching and removes the staging folder along with anything left in it
+
+        Return: void
+        """
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+
+def Arm(driver, staging_root):
+    """
+    Sends the next download of driver to a new staging folder and starts watching it.
+    To be called right before clicking a download button.
+
+    driver -- chrome webdriver
+    staging_root -- folder holding per download staging folders
+    Return: DownloadWatcher
+    """
+    directory = os.path.join(staging_root, uuid.uuid4().hex)
+    os.makedirs(directory)
+
+    watcher = DownloadWatcher(directory)  # watch before chrome can write anything
+
+    driver.execute_cdp_cmd(
+        "Browser.setDownloadBehavior",
+        {"behavior": "allow", "downloadPath": directory},
+    )
+    return watcher
@@ -0,0 +1,189 @@
+"""
+Downloads bulk zips over a pooled HTTP session instead of chrome's download manager.
+
+The bulk download button is still clicked in the browser, but with chrome's downloads denied.
+The request it made is read back from chrome's performance log, then replayed with the
+driver's cookies through a requests session and streamed in large chunks to a ".part" file that
+is renamed to the final zip path once complete. Interrupted transfers resume with Range requests
+from the ".part" file.
+
+requires:
+pip install requests
+"""
+
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+import requests
+import urllib3
+from requests.adapters import HTTPAdapter
+
+urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+
+chunk_size = 1024 * 1024  # bytes written per chunk
+attempts = 3  # transfers tried, resuming each time, before giving up
+
+# Response types that mean the request was the zip itself
+ZIP_TYPES = ["application/zip", "application/x-zip-compressed", "application/octet-stream"]
+
+# Captured headers requests sets itself
+SKIPPED_HEADERS = ["cookie", "host", "content-length", "connection", "accept-encoding"]
+
+sessions = {}  # requests.Session per webdriver session id
+pool = ThreadPoolExecutor(max_workers=4)  # transfers run off the browser's thread
+
+
+def GetSession(driver):
+    """
+    Returns a pooled HTTP session carrying the driver's current cookies and user agent
+
+    driver -- authenticated webdriver
+    Return: requests.Session
+    """
+    session = sessions.get(driver.session_id)
+    if session is None:
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=8)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        session.headers["User-Agent"] = driver.execute_script(
+            "return navigator.userAgent"
+        )
+        session.verify = False  # matches acceptInsecureCerts on the driver
+        sessions[driver.session_id] = session
+
+    # Cookies are copied every time, the proxy refreshes them during a run
+    for cookie in driver.get_cookies():
+        session.cookies.set(
+            cookie["name"],
+            cookie["value"],
+            domain=cookie.get("domain"),
+            path=cookie.get("path", "/"),
+        )
+    return session
+
+
+def CaptureRequest(driver, click, timeout=30):
+    """
+    Clicks a download button with chrome's downloads denied and reads back the request it sent
+
+    driver -- webdriver created with performance logging (see downloadscript.CreateDriver)
+    click -- function without arguments that starts the download
+    timeout -- seconds to wait for the download response
+    Return: dict with url, method, headers and body of the request, None if nothing was seen
+    """
+    driver.get_log("performance")  # drop entries from earlier pages
+    driver.execute_cdp_cmd("Browser.setDownloadBehavior", {"behavior": "deny"})
+
+    requests_seen = {}  # request id: request params
+    deadline = time.monotonic() + timeout
+
+    click()
+
+    while time.monotonic() < deadline:
+        for entry in driver.get_log("performance"):
+            message = json.loads(entry["message"])["message"]
+            params = message.get("params", {})
+
+            if message["method"] == "Network.requestWillBeSent":
+                requests_seen[params["requestId"]] = params["request"]
+
+            elif message["method"] == "Network.responseReceived":
+                response = params["response"]
+                headers = {k.lower(): v for k, v in response["headers"].items()}
+                is_zip = response.get("mimeType") in ZIP_TYPES or "attachment" in (
+                    headers.get("content-disposition", "")
+                )
+                request = requests_seen.get(params["requestId"])
+
+                if is_zip and request is not None:
+                    body = request.get("postData")
+                    if body is None and request.get("hasPostData"):
+                        body = driver.execute_cdp_cmd(
+                            "Network.getRequestPostData",
+                            {"requestId": params["requestId"]},
+                        )["postData"]
+
+                    return {
+                        "url": request["url"],
+                        "method": request["method"],
+                        "headers": {
+                            k: v
+                            for k, v in request["headers"].items()
+                            if k.lower() not in SKIPPED_HEADERS and not k.startswith(":")
+                        },
+                        "body": body,
+                    }
+        time.sleep(0.25)
+
+    return None
+
+
+def Fetch(session, request, path, part_path):
+    """
+    Streams a captured request to part_path, resuming it with Range requests, then renames it to path
+
+    session -- requests.Session from GetSession
+    request -- dict from CaptureRequest
+    path -- final zip path, only created once the transfer is complete
+    part_path -- partial file, kept between attempts and runs
+    Return: (bytes written to path, seconds taken)
+    """
+    start = time.monotonic()
+
+    for attempt in range(attempts):
+        offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+        headers = dict(request["headers"])
+        if offset:
+            headers["Range"] = "bytes=" + str(offset) + "-"
+
+        try:
+            with session.request(
+                request["method"],
+                request["url"],
+                data=request["body"],
+                headers=headers,
+                stream=True,
+                timeout=(30, 300),
+            ) as response:
+
+                if response.status_code == 416 and offset:
+                    break  # part file already holds everything
+
+                response.raise_for_status()
+
+                # 206 continues the part file, anything else restarts it
+                mode = "ab" if response.status_code == 206 else "wb"
+                with open(part_path, mode) as file:
+                    for chunk in response.iter_content(chunk_size):
+                        file.write(chunk)
+            break
+
+        except (
+            requests.ConnectionError,
+            requests.Timeout,
+            requests.exceptions.ChunkedEncodingError,
+        ):
+            if attempt == attempts - 1:
+                raise
+
+    os.replace(part_path, path)
+    return os.path.getsize(path), time.monotonic() - start
+
+
+def Download(driver, click, path, part_path):
+    """
+    Starts a bulk download through the browser and streams it to path over HTTP
+
+    driver -- authenticated webdriver
+    click -- function without arguments that starts the download
+    path -- final zip path
+    part_path -- partial file to stream into, must be on the same drive as path
+    Return: Future resolving to (bytes, seconds), or None if no download request was seen
+    """
+    request = CaptureRequest(driver, click)
+    if request is None:
+        return None
+
+    return pool.submit(Fetch, GetSession(driver), request, path, part_path)
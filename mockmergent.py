@@ -0,0 +1,711 @@
+"""
+Local stand-in for the parts of Mergent Archives that downloadscript.py drives, for offline
+benchmarks and regression runs without the proxy or its download throttle.
+
+Serves search.php (doctype combo ext-comp-1014, companyName, submit ext-gen224), a results page
+with the ext-gen96 grid, limitCount, the page count span at the xpath ResultActions reads, the
+ext-gen147 page box, check_all_label and bulk_download_btn, which returns a generated zip of dummy
+PDFs for the checked rows. The results page also carries a small stand-in for the ExtJS grid and its
+store, backed by results.json, for FetchAllPages. Results are generated from a hash of the company name, so every run
+sees the same reports.
+
+Usage:
+python mockmergent.py --port 8000
+python mockmergent.py --write-firms 10000   (writes ARC_HH_OK_AR_missing.csv for the mock firms)
+python mockmergent.py --bench 100           (runs SearchActions for the first 100 mock firms)
+python mockmergent.py --bench 100 --pipeline 2 (same, searching ahead of 2 unfinished downloads)
+python mockmergent.py --navigation-report 20 (times page loads with and without the fast driver profile)
+"""
+
+import argparse
+import csv
+import html
+import io
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+import zipfile
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, quote, urlparse
+
+rows_per_page = 25
+grid_delay_ms = 300  # results grid renders behind a loading mask for this long, like the real ajax grid
+pdf_kb = 40  # padding per dummy PDF
+download_mbps = 20.0  # bulk downloads are streamed at this rate, 0 for unlimited
+asset_delay_ms = 150  # images, fonts and analytics are served this slowly, like the real site's extras
+
+# Options of the doctype combo in order, ARROW_UP x20 then ARROW_DOWN x3 lands on ANR
+DOCTYPE_OPTIONS = ["ALL", "10K", "10Q", "ANR", "PRX", "IPO"]
+
+# Doctypes generated for unfiltered searches, "Annual Report" is what the ANR filter returns
+REPORT_DOCTYPES = [
+    "Annual Report",
+    "Annual Report",
+    "Annual/10K Report",
+    "10K or Int'l Equivalent",
+    "Proxy Statement",
+]
+
+
+def FirmName(number):
+    """
+    number -- int firm number
+    Return: company name used for mock firm number
+    """
+    return "MOCK COMPANY " + str(number).zfill(5) + " INC"
+
+
+def Reports(company, doctype):
+    """
+    Generates the reports a search returns, most recent first
+
+    company -- search term
+    doctype -- doctype filter, "ANR" or anything else for every doctype
+    Return: list of dicts with id, name, date, doctype, size_kb
+    """
+    seed = zlib.crc32(company.upper().encode())
+    rng = random.Random(seed)
+
+    reports = []
+    for x in range(rng.randint(0, 60)):
+        reports.append(
+            {
+                "id": 100000 + (seed + x * 7919) % 900000,
+                "name": company.title(),
+                "date": str(rng.randint(1, 12))
+                + "/"
+                + str(rng.randint(1, 28))
+                + "/"
+                + str(2010 - x // 2),
+                "doctype": rng.choice(REPORT_DOCTYPES),
+                "size_kb": rng.randint(80, 900),
+            }
+        )
+
+    if doctype == "ANR":
+        reports = [report for report in reports if report["doctype"] == "Annual Report"]
+    return reports
+
+
+def DummyPdf(title, pad_kb):
+    """
+    Builds a one page PDF holding title, padded with a comment block
+
+    title -- text drawn on the page
+    pad_kb -- padding size in kb
+    Return: bytes
+    """
+    text = title.replace("\\", "").replace("(", "").replace(")", "")
+    content = ("BT /F1 18 Tf 72 700 Td (" + text + ") Tj ET").encode()
+    objects = [
+        b"<</Type/Catalog/Pages 2 0 R>>",
+        b"<</Type/Pages/Kids[3 0 R]/Count 1>>",
+        b"<</Type/Page/Parent 2 0 R/MediaBox[0 0 612 792]/Contents 4 0 R"
+        b"/Resources<</Font<</F1 5 0 R>>>>>>",
+        b"<</Length " + str(len(content)).encode() + b">>stream\n" + content + b"\nendstream",
+        b"<</Type/Font/Subtype/Type1/BaseFont/Helvetica>>",
+    ]
+
+    pdf = bytearray(b"%PDF-1.4\n")
+    pdf += (b"%" + b"0" * 78 + b"\n") * (pad_kb * 1024 // 80)
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(pdf))
+        pdf += str(number).encode() + b" 0 obj" + body + b"endobj\n"
+
+    xref = len(pdf)
+    pdf += b"xref\n0 " + str(len(objects) + 1).encode() + b"\n0000000000 65535 f \n"
+    for offset in offsets:
+        pdf += str(offset).zfill(10).encode() + b" 00000 n \n"
+    pdf += (
+        b"trailer<</Size "
+        + str(len(objects) + 1).encode()
+        + b"/Root 1 0 R>>\nstartxref\n"
+        + str(xref).encode()
+        + b"\n%%EOF\n"
+    )
+    return bytes(pdf)
+
+
+def Nest(indices, inner):
+    """
+    Wraps inner in divs so it sits at an xpath like div[9]/div[2]/div below the parent.
+    An index n puts n - 1 empty divs before the target, None gives it no div siblings.
+
+    indices -- list of ints or None, outermost first
+    inner -- html string
+    Return: html string
+    """
+    for index in reversed(indices):
+        inner = "<div></div>" * ((index or 1) - 1) + "<div>" + inner + "</div>"
+    return inner
+
+
+# Resources the real pages load that the scripts never read
+ASSETS = """<link rel="stylesheet" href="/static/theme.css">
+<script async src="/static/analytics.js"></script>
+"""
+ASSET_IMAGES = """<img src="/static/logo.png"><img src="/static/banner.jpg"><img src="/static/sprite.gif">
+"""
+
+SEARCH_PAGE = """<!DOCTYPE html>
+<html><head><title>Mergent Archives</title>%(assets)s</head>
+<body>
+%(images)s
+<form id="search" action="/results.php" method="get">
+  <input id="ext-comp-1014" type="text" autocomplete="off" value="ALL">
+  <input id="doctype" type="hidden" name="doctype" value="ALL">
+  <input name="companyName" type="text">
+  <button id="ext-gen224" type="submit">Search</button>
+</form>
+<script>
+var options = %(options)s;
+var combo = document.getElementById("ext-comp-1014");
+var selected = 0;
+combo.addEventListener("click", function () {
+    if (!document.getElementById("ext-gen302")) {
+        var list = document.createElement("div");
+        list.id = "ext-gen302";
+        list.textContent = options.join(" ");
+        document.body.appendChild(list);
+    }
+});
+combo.addEventListener("keydown", function (event) {
+    if (event.key == "ArrowUp") { selected = Math.max(0, selected - 1); }
+    else if (event.key == "ArrowDown") { selected = Math.min(options.length - 1, selected + 1); }
+    else if (event.key == "Enter") {
+        event.preventDefault();
+        document.getElementById("doctype").value = options[selected];
+    }
+    combo.value = options[selected];
+});
+</script>
+</body></html>
+"""
+
+RESULTS_PAGE = """<!DOCTYPE html>
+<html><head><title>Mergent Archives Results</title>%(assets)s</head>
+<body>
+%(images)s
+%(pager)s
+<div>
+  <span id="limitCount">%(count)s</span>
+  <label id="check_all_label"><input id="check_all" type="checkbox">Check all</label>
+  <button id="bulk_download_btn">Bulk Download</button>
+  <div class="ext-el-mask" style="display:block">Loading...</div>
+  <div id="ext-gen96"><table><tbody></tbody></table></div>
+</div>
+<script>
+var rows = %(rows)s;
+var query = %(query)s;
+var page = %(page)s;
+
+setTimeout(function () {
+    var body = document.querySelector("#ext-gen96 > table > tbody");
+    rows.forEach(function (row, index) {
+        var tr = document.createElement("tr");
+        var cells = ['<input type="checkbox" data-id="' + row.id + '" data-row="' + (index + 1) + '">',
+                     row.name, "", row.date, row.doctype, row.size];
+        cells.forEach(function (cell, cellIndex) {
+            var td = document.createElement("td");
+            td.innerHTML = cellIndex == 0 ? cell : "<div>" + cell + "</div>";
+            tr.appendChild(td);
+        });
+        body.appendChild(tr);
+    });
+    document.querySelector(".ext-el-mask").style.display = "none";
+}, %(delay)s);
+
+// Just enough of ExtJS 3 for FetchAllPages: the grid component, its store, column model and Ext.Ajax
+var store = {
+    baseParams: {},
+    lastOptions: {params: {start: (page - 1) * %(per_page)s, limit: %(per_page)s}},
+    proxy: {url: "/results.json?" + query, conn: {method: "GET"}},
+    reader: {read: function (response) {
+        var data = JSON.parse(response.responseText);
+        return {totalRecords: data.total, records: data.rows.map(function (row) {
+            return {data: row, get: function (field) { return this.data[field]; }};
+        })};
+    }},
+    getTotalCount: function () { return %(count)s; }
+};
+var columns = ["id", "name", "", "date", "doctype", "size"];
+var grid = {
+    rendered: true,
+    isXType: function (type) { return type == "grid"; },
+    getEl: function () { return {dom: document.body}; },
+    getStore: function () { return store; },
+    getBottomToolbar: function () { return {pageSize: %(per_page)s}; },
+    getColumnModel: function () {
+        return {
+            getDataIndex: function (column) { return columns[column]; },
+            getRenderer: function (column) { return function (value) { return value; }; }
+        };
+    }
+};
+window.Ext = {
+    apply: function (target, source) {
+        for (var name in source) { target[name] = source[name]; }
+        return target;
+    },
+    ComponentMgr: {all: {each: function (callback) { callback(grid); }}},
+    Ajax: {request: function (options) {
+        var url = options.url;
+        for (var name in options.params) {
+            url += "&" + encodeURIComponent(name) + "=" + encodeURIComponent(options.params[name]);
+        }
+        var request = new XMLHttpRequest();
+        request.open(options.method, url);
+        request.timeout = options.timeout;
+        request.onload = function () {
+            (request.status == 200 ? options.success : options.failure)(request);
+        };
+        request.onerror = request.ontimeout = function () { options.failure(request); };
+        request.send();
+    }}
+};
+
+document.getElementById("check_all_label").addEventListener("click", function (event) {
+    event.preventDefault();
+    var boxes = document.querySelectorAll("#ext-gen96 input[type=checkbox]");
+    var check = !Array.prototype.every.call(boxes, function (box) { return box.checked; });
+    boxes.forEach(function (box) { box.checked = check; });
+});
+
+document.getElementById("bulk_download_btn").addEventListener("click", function () {
+    var ids = [];
+    document.querySelectorAll("#ext-gen96 input[type=checkbox]").forEach(function (box) {
+        if (box.checked) { ids.push(box.dataset.id + ":" + box.dataset.row); }
+    });
+    if (ids.length) {
+        window.location = "/bulk_download.php?" + query + "&ids=" + ids.join(",");
+    }
+});
+
+document.getElementById("ext-gen147").addEventListener("keydown", function (event) {
+    if (event.key == "Enter") {
+        window.location = "/results.php?" + query + "&page=" + encodeURIComponent(this.value);
+    }
+});
+</script>
+</body></html>
+"""
+
+# Pager toolbar, td[6] span holds "of N" at the xpath ResultActions reads, ext-gen147 is in td[5]
+PAGER_CELLS = (
+    "<table><tbody><tr><td></td><td></td><td></td><td>Page</td>"
+    '<td><input id="ext-gen147" type="text" value="%(page)s"></td>'
+    "<td><span>of %(pages)s</span></td></tr></tbody></table>"
+)
+PAGER_PATH = [9, 2, None, 3, 2, None, 2, 2, None, None, 1, 5, None]
+
+
+def Rows(reports):
+    """
+    reports -- list of Reports dicts
+    Return: list of grid rows as the results page and its store show them
+    """
+    return [
+        {
+            "id": report["id"],
+            "name": html.escape(report["name"]),
+            "date": report["date"],
+            "doctype": html.escape(report["doctype"]),
+            "size": str(report["size_kb"]) + " KB",
+        }
+        for report in reports
+    ]
+
+
+class MergentHandler(BaseHTTPRequestHandler):
+    """
+    Serves the stand-in pages, see module docstring
+    """
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        params = {key: values[0] for key, values in parse_qs(url.query).items()}
+
+        if url.path in ["/", "/search.php"]:
+            self.Send(
+                SEARCH_PAGE
+                % {
+                    "options": json.dumps(DOCTYPE_OPTIONS),
+                    "assets": ASSETS,
+                    "images": ASSET_IMAGES,
+                }
+            )
+        elif url.path == "/results.php":
+            self.Results(params)
+        elif url.path == "/results.json":
+            self.ResultsJson(params)
+        elif url.path == "/bulk_download.php":
+            self.BulkDownload(params)
+        elif url.path.startswith("/static/"):
+            self.Asset(url.path)
+        else:
+            self.send_error(404)
+
+    def Results(self, params):
+        company = params.get("companyName", "")
+        doctype = params.get("doctype", "ALL")
+        reports = Reports(company, doctype)
+
+        pages = max(1, -(-len(reports) // rows_per_page))
+        try:
+            page = min(max(1, int(params.get("page", "1"))), pages)
+        except ValueError:
+            page = 1
+        page_reports = reports[(page - 1) * rows_per_page : page * rows_per_page]
+
+        rows = Rows(page_reports)
+        pager = PAGER_CELLS % {"page": page, "pages": pages}
+
+        self.Send(
+            RESULTS_PAGE
+            % {
+                "pager": Nest(PAGER_PATH, pager),
+                "count": len(reports),
+                "rows": json.dumps(rows),
+                "query": json.dumps(
+                    "companyName=" + quote(company) + "&doctype=" + quote(doctype)
+                ),
+                "page": page,
+                "per_page": rows_per_page,
+                "delay": grid_delay_ms,
+                "assets": ASSETS,
+                "images": ASSET_IMAGES,
+            }
+        )
+
+    def ResultsJson(self, params):
+        reports = Reports(params.get("companyName", ""), params.get("doctype", "ALL"))
+        try:
+            start = max(0, int(params.get("start", "0")))
+            limit = max(0, int(params.get("limit", str(rows_per_page))))
+        except ValueError:
+            start, limit = 0, rows_per_page
+
+        body = json.dumps(
+            {"total": len(reports), "rows": Rows(reports[start : start + limit])}
+        ).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def BulkDownload(self, params):
+        company = params.get("companyName", "")
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, "w", zipfile.ZIP_STORED) as zip:
+            for item in params.get("ids", "").split(","):
+                if ":" in item:
+                    doc_id, row = item.split(":", 1)
+                    zip.writestr(
+                        doc_id + "_" + row + ".pdf",
+                        DummyPdf("ANNUAL REPORT " + company, pdf_kb),
+                    )
+        body = buffer.getvalue()
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/zip")
+        self.send_header(
+            "Content-Disposition",
+            'attachment; filename="MergentArchives_' + str(int(time.time() * 1000)) + '.zip"',
+        )
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+
+        chunk = 64 * 1024
+        for offset in range(0, len(body), chunk):
+            self.wfile.write(body[offset : offset + chunk])
+            if download_mbps:
+                time.sleep(chunk / (download_mbps * 1000000.0))
+
+    def Asset(self, path):
+        time.sleep(asset_delay_ms / 1000.0)
+        types = {
+            ".css": "text/css",
+            ".js": "application/javascript",
+            ".png": "image/png",
+            ".jpg": "image/jpeg",
+            ".gif": "image/gif",
+        }
+        body = b"/* */" if path.endswith((".css", ".js")) else b"\0" * 2048
+        self.send_response(200)
+        self.send_header("Content-Type", types.get(path[path.rfind(".") :], "text/plain"))
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def Send(self, text):
+        body = text.encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # quiet, benchmarks make thousands of requests
+
+
+def StartServer(port=0):
+    """
+    Starts the stand-in server on a background thread
+
+    port -- port to listen on, 0 picks a free one
+    Return: (server, base url)
+    """
+    server = ThreadingHTTPServer(("127.0.0.1", port), MergentHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, "http://127.0.0.1:" + str(server.server_port)
+
+
+def WriteFirms(count, path="ARC_HH_OK_AR_missing.csv"):
+    """
+    Writes a missing csv for count mock firms, two years each, in the columns the scripts read:
+    [1] gvkey, [8] data date, [9] year, [16] company name
+
+    Return: void
+    """
+    with open(path, "w", newline="") as file:
+        writer = csv.writer(file)
+        writer.writerow(["col" + str(x) for x in range(17)])
+        for number in range(1, count + 1):
+            for year in ["2005", "2006"]:
+                row = [""] * 17
+                row[1] = str(100000 + number)
+                row[8] = year + "-12-31 00:00:00"
+                row[9] = year
+                row[16] = FirmName(number)
+                writer.writerow(row)
+
+
+def Bench(count, pipeline=0):
+    """
+    Runs downloadscript's search, scrape and download actions for the first count mock firms
+    against a local server and prints firms per hour. Runs in a scratch folder, so the real
+    runstate.db, trackers, zips, checkpoints and chrome profiles are left alone.
+
+    pipeline -- downloads left in flight at once, 0 to wait for each
+    Return: void
+    """
+    import downloadscript  # only the benchmark needs selenium
+
+    home = os.getcwd()
+    directory = tempfile.mkdtemp(prefix="bench_")
+    os.chdir(directory)
+    try:
+        RunBench(downloadscript, count, pipeline)
+    finally:
+        os.chdir(home)
+    print("Zips, trackers and trace.jsonl are in " + directory)
+
+
+def RunBench(downloadscript, count, pipeline):
+    """
+    Body of Bench, run in its scratch folder
+
+    Return: void
+    """
+    server, base_url = StartServer()
+    if pipeline:
+        downloadscript.EnablePipeline(pipeline)
+    downloadscript.scheduler = downloadscript.RateScheduler(cap_kb=float("inf"))
+    downloadscript.CreateTrackers()
+    driver = downloadscript.CreateDriver(base_url)
+
+    class Bar:  # stands in for alive_progress
+        def text(self, text):
+            pass
+
+    start = time.monotonic()
+    total_kb = 0.0
+    for number in range(1, count + 1):
+        with downloadscript.phasetrace.Firm(str(100000 + number), FirmName(number)):
+            total_kb = downloadscript.SearchActions(
+                driver, Bar(), str(100000 + number), FirmName(number), total_kb, False
+            )
+    downloadscript.DrainCompletions()
+    seconds = time.monotonic() - start
+    total_kb += downloadscript.pipelined_kb
+
+    downloadscript.CloseTrackers()
+    driver.quit()
+    server.shutdown()
+
+    print(
+        str(count)
+        + " firms in "
+        + str(round(seconds, 1))
+        + "s, "
+        + str(round(count / seconds * 3600))
+        + " firms/hour, "
+        + str(round(total_kb / 1000.0, 1))
+        + "MB"
+    )
+    print("Transfers: " + downloadscript.TransferSummary())
+    print("Waits:\n" + downloadscript.WaitSummary())
+    print(downloadscript.phasetrace.Summary())
+
+
+def MetadataBench(zip_count, scale=10):
+    """
+    Times verifyscript.OpenTrackers on generated trackers and folders of zip_count zips, then of
+    scale times as many, in a scratch folder. About 7 files per zip, like the real 3k zips and 20k files.
+
+    zip_count -- zips at the first scale
+    scale -- times more zips at the second
+    Return: void
+    """
+    import runstate
+    import verifyscript  # only the benchmark needs PyMuPDF and the rest of verifyscript's imports
+
+    home = os.getcwd()
+    for zips in [zip_count, zip_count * scale]:
+        directory = tempfile.mkdtemp(prefix="metadata_bench_")
+        os.chdir(directory)
+        runstate.Close()  # a new runstate.db in the scratch folder
+
+        rng = random.Random(zips)
+        zip_rows, file_rows = [], []
+        number = 0
+        while len(zip_rows) < zips:
+            number += 1
+            key, name = str(100000 + number), FirmName(number)
+            for page in range(1, rng.randint(1, 3) + 1):
+                folder = os.path.join(
+                    "folders",
+                    key + "_" + name.replace(" ", "-") + "_2001_2010_" + str(page),
+                )
+                os.makedirs(folder)
+                for row in rng.sample(range(1, rows_per_page + 1), rng.randint(1, 13)):
+                    file_name = str(rng.randint(100000, 999999)) + "_" + str(row) + ".pdf"
+                    open(os.path.join(folder, file_name), "w").close()
+                    file_rows.append([key, name, row, page, "12/31/2005", "Annual Report"])
+                zip_rows.append([key, name, page])
+            zip_rows.append([key, name, "TL"])
+
+        runstate.InsertMany("ziptracker", zip_rows)
+        runstate.InsertMany("filestracker", file_rows)
+        runstate.Clear("metadata")
+
+        start = time.monotonic()
+        verifyscript.OpenTrackers()
+        seconds = time.monotonic() - start
+        print(
+            str(len(zip_rows))
+            + " ziptracker rows, "
+            + str(len(file_rows))
+            + " files: "
+            + str(round(seconds, 2))
+            + "s, "
+            + str(len(runstate.Rows("metadata")))
+            + " metadata rows, in "
+            + directory
+        )
+        runstate.Close()
+        os.chdir(home)
+
+
+def NavigationReport(count):
+    """
+    Times navigations against a local server with the default driver profile, then with
+    downloadscript's fast profile (eager page loads, blocked resources, persistent profile),
+    and prints both per navigation
+
+    count -- mock firms to navigate through
+    Return: void
+    """
+    import downloadscript  # only the benchmark needs selenium
+
+    home = os.getcwd()
+    os.chdir(tempfile.mkdtemp(prefix="navigation_report_"))  # chrome profiles stay out of the real ones
+    try:
+        RunNavigationReport(downloadscript, count)
+    finally:
+        os.chdir(home)
+
+
+def RunNavigationReport(downloadscript, count):
+    """
+    Body of NavigationReport, run in its scratch folder
+
+    Return: void
+    """
+    server, base_url = StartServer()
+    timings = {}  # (profile name, navigation): list of seconds
+
+    for name, fast in [("before", False), ("after", True)]:
+        downloadscript.fast_profile = fast
+        downloadscript.persistent_profile = fast
+        driver = downloadscript.CreateDriver(base_url, "navigation_report")
+
+        for number in range(1, count + 1):
+            query = "companyName=" + quote(FirmName(number)) + "&doctype=ALL"
+            for navigation, url in [
+                ("search page", downloadscript.SearchUrl()),
+                ("results page 1", base_url + "/results.php?" + query),
+                ("results page 2", base_url + "/results.php?" + query + "&page=2"),
+            ]:
+                start = time.monotonic()
+                driver.get(url)
+                timings.setdefault((name, navigation), []).append(
+                    time.monotonic() - start
+                )
+        driver.quit()
+
+    server.shutdown()
+
+    for navigation in ["search page", "results page 1", "results page 2"]:
+        line = navigation + ":"
+        for name in ["before", "after"]:
+            seconds = sorted(timings[(name, navigation)])
+            line += (
+                " "
+                + name
+                + " p50 "
+                + str(round(seconds[len(seconds) // 2] * 1000))
+                + "ms max "
+                + str(round(seconds[-1] * 1000))
+                + "ms"
+            )
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local Mergent Archives stand-in")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--write-firms", type=int, metavar="N")
+    parser.add_argument("--bench", type=int, metavar="N")
+    parser.add_argument("--pipeline", type=int, default=0, metavar="DEPTH")
+    parser.add_argument("--navigation-report", type=int, metavar="N")
+    parser.add_argument("--metadata-bench", type=int, metavar="ZIPS")
+    args = parser.parse_args()
+
+    if args.write_firms:
+        WriteFirms(args.write_firms)
+    elif args.bench:
+        Bench(args.bench, args.pipeline)
+    elif args.navigation_report:
+        NavigationReport(args.navigation_report)
+    elif args.metadata_bench:
+        MetadataBench(args.metadata_bench)
+    else:
+        server, base_url = StartServer(args.port)
+        print("Serving " + base_url + "/search.php")
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
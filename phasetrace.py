@@ -0,0 +1,302 @@
+"""
+Per firm and per page phase timing for the download loop
+
+downloadscript.py marks where time goes (navigation, doctype selection, grid load, scrape,
+throttle, download start, transfer, rename) and every firm and every results page it works through
+is written as one json line to trace.jsonl, with the seconds spent in each phase, bytes downloaded
+and the outcome written to ziptracker (a page number, SK, NA or TL).
+
+Records are kept per thread so download workers each trace their own firm. Work finishing on another
+thread, such as pipelined downloads completing on downloadscript's completion queue, holds its records
+with Capture and adds to them inside Attach, and they are written once it calls Release.
+
+Summary of a trace:
+python phasetrace.py [trace.jsonl]
+"""
+
+import json
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+trace_path = "trace.jsonl"
+enabled = True
+
+state = threading.local()  # firm and page records open on this thread
+write_lock = threading.Lock()
+record_lock = threading.RLock()  # guards records shared with other threads through Capture
+
+
+def NewRecord(kind, key, **fields):
+    """
+    Return: dict record with no phases timed yet
+    """
+    record = {"type": kind, "gvkey": key, "start": time.time(), "phases": {}}
+    record.update(fields)
+    return record
+
+
+def End(record):
+    """
+    Ends a record, writing it now unless work captured on another thread is still adding to it
+
+    Return: void
+    """
+    with record_lock:
+        record["ended"] = time.time()
+        if record.get("pending"):
+            return  # written by the last Release
+    Write(record)
+
+
+def Write(record):
+    """
+    Finishes an ended record and appends it to the trace
+
+    Return: void
+    """
+    with record_lock:
+        record.pop("pending", None)
+        record["seconds"] = round(record.pop("ended") - record["start"], 3)
+        record["phases"] = {
+            phase: round(seconds, 3) for phase, seconds in record["phases"].items()
+        }
+    with write_lock:
+        with open(trace_path, "a") as file:
+            file.write(json.dumps(record) + "\n")
+
+
+@contextmanager
+def Firm(key, val):
+    """
+    Traces everything done for one firm inside the with block.
+    Nested calls on the same thread, such as an unfiltered search after an empty one, join the open firm.
+
+    key -- company key
+    val -- company name
+    """
+    if not enabled or getattr(state, "firm", None) is not None:
+        yield
+        return
+
+    state.firm = NewRecord("firm", key, name=val, outcomes=[], bytes=0)
+    state.page = None
+    try:
+        yield
+    finally:
+        EndPage()
+        End(state.firm)
+        state.firm = None
+
+
+def StartPage(key, page):
+    """
+    Starts tracing a results page of the open firm, ending the page traced before it
+
+    key -- company key
+    page -- page number
+    Return: void
+    """
+    EndPage()
+    if getattr(state, "firm", None) is not None:
+        state.page = NewRecord("page", key, page=int(page), outcome=None, bytes=0)
+
+
+def EndPage():
+    """
+    Writes the open page record, if any
+
+    Return: void
+    """
+    if getattr(state, "page", None) is not None:
+        End(state.page)
+        state.page = None
+
+
+def OpenRecords():
+    """
+    Return: list of records open on this thread, page first
+    """
+    return [
+        record
+        for record in [getattr(state, "page", None), getattr(state, "firm", None)]
+        if record is not None
+    ]
+
+
+def AddPhase(name, seconds):
+    """
+    Adds seconds to phase name of the open page and firm, so firm records hold the totals of their pages
+
+    Return: void
+    """
+    with record_lock:
+        for record in OpenRecords():
+            phases = record["phases"]
+            phases[name] = phases.get(name, 0.0) + seconds
+
+
+@contextmanager
+def Phase(name):
+    """
+    Adds the time spent in the with block to phase name, see AddPhase
+    """
+    start = time.monotonic()
+    try:
+        yield
+    finally:
+        AddPhase(name, time.monotonic() - start)
+
+
+def Count(name, amount=1):
+    """
+    Adds to a counter field of the open firm, e.g. doctype selection attempts
+
+    Return: void
+    """
+    with record_lock:
+        if getattr(state, "firm", None) is not None:
+            state.firm[name] = state.firm.get(name, 0) + amount
+
+
+def Bytes(amount):
+    """
+    Adds downloaded bytes to the open page and firm
+
+    Return: void
+    """
+    with record_lock:
+        for record in OpenRecords():
+            record["bytes"] += amount
+
+
+def Outcome(code):
+    """
+    Records what was written to ziptracker, a page number, SK, NA or TL
+
+    Return: void
+    """
+    with record_lock:
+        page = getattr(state, "page", None)
+        if page is not None:
+            page["outcome"] = code
+        if getattr(state, "firm", None) is not None:
+            state.firm["outcomes"].append(code)
+
+
+def Capture():
+    """
+    Holds the page and firm records open on this thread for work that finishes on another thread,
+    so they are not written before that work calls Release
+
+    Return: list of records, for Attach and Release
+    """
+    records = OpenRecords()
+    with record_lock:
+        for record in records:
+            record["pending"] = record.get("pending", 0) + 1
+    return records
+
+
+@contextmanager
+def Attach(records):
+    """
+    Adds the phases and bytes traced on this thread inside the with block to records from Capture
+    """
+    saved = getattr(state, "page", None), getattr(state, "firm", None)
+    state.page = next((record for record in records if record["type"] == "page"), None)
+    state.firm = next((record for record in records if record["type"] == "firm"), None)
+    try:
+        yield
+    finally:
+        state.page, state.firm = saved
+
+
+def Release(records):
+    """
+    Lets records from Capture be written, writing those already ended
+
+    Return: void
+    """
+    for record in records:
+        with record_lock:
+            record["pending"] -= 1
+            ended = not record["pending"] and "ended" in record
+        if ended:
+            Write(record)
+
+
+def Percentile(values, fraction):
+    """
+    values -- sorted list of numbers
+    fraction -- 0 to 1
+    Return: nearest rank percentile
+    """
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+def Summary(path=None):
+    """
+    Summarizes a trace: p50 and p95 seconds per phase for pages and firms, firms per hour and outcomes
+
+    path -- trace file, defaults to trace_path
+    Return: string
+    """
+    records = []
+    with open(path or trace_path, "r") as file:
+        for line in file:
+            if line.strip():
+                records.append(json.loads(line))
+
+    lines = []
+    for kind in ["firm", "page"]:
+        kind_records = [record for record in records if record["type"] == kind]
+        if not kind_records:
+            continue
+
+        phases = {"total": [record["seconds"] for record in kind_records]}
+        for record in kind_records:
+            for phase, seconds in record["phases"].items():
+                phases.setdefault(phase, []).append(seconds)
+
+        lines.append(kind + "s (" + str(len(kind_records)) + "):")
+        for phase, seconds in sorted(phases.items(), key=lambda item: -sum(item[1])):
+            seconds.sort()
+            lines.append(
+                "  "
+                + phase.ljust(16)
+                + "p50 "
+                + str(round(Percentile(seconds, 0.5), 2)).rjust(8)
+                + "s  p95 "
+                + str(round(Percentile(seconds, 0.95), 2)).rjust(8)
+                + "s  total "
+                + str(round(sum(seconds) / 60.0, 1))
+                + " minutes"
+            )
+
+    firms = [record for record in records if record["type"] == "firm"]
+    if firms:
+        hours = (
+            max(record["start"] + record["seconds"] for record in firms)
+            - min(record["start"] for record in firms)
+        ) / 3600.0
+        outcomes = {}
+        for record in firms:
+            for code in record["outcomes"] or ["none"]:
+                code = code if code in ["SK", "NA", "TL", "none"] else "page"
+                outcomes[code] = outcomes.get(code, 0) + 1
+
+        lines.append(
+            str(round(len(firms) / hours, 1) if hours > 0 else len(firms))
+            + " firms/hour, "
+            + str(round(sum(record["bytes"] for record in firms) / 1000000.0, 1))
+            + "MB, outcomes: "
+            + ", ".join(code + " " + str(count) for code, count in sorted(outcomes.items()))
+        )
+
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    print(Summary(sys.argv[1] if len(sys.argv) > 1 else None))
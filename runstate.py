@@ -0,0 +1,463 @@
+"""
+Single SQLite store for the pipeline's run state
+
+Every csv artifact (ziptracker, filestracker, metadata, matching, confirmations, complexities)
+is kept as a table in runstate.db, indexed on GVKey, (GVKey, year) and filename so each stage can
+look rows up instead of rescanning whole files. Rows are stored as the same strings that would be
+written to csv, in insertion order, so ExportCsv reproduces the csv files exactly, apart from
+confirmations rows the platform encoding cannot write, which are skipped as before and listed.
+
+Existing csv files are imported the first time a table is created.
+"""
+
+import csv
+import os
+import sqlite3
+import threading
+
+db_path = "runstate.db"
+missing_csv = "ARC_HH_OK_AR_missing.csv"
+
+# Table name: (csv path, csv header, column names)
+TABLES = {
+    "ziptracker": (
+        "./trackers/ziptracker.csv",
+        ["Global Company Key", "Company Name", "Page Found On"],
+        ["gvkey", "name", "page"],
+    ),
+    "filestracker": (
+        "./trackers/filestracker.csv",
+        [
+            "Global Company Key",
+            "Company Name",
+            "Row Number",
+            "Page Number",
+            "Filing Date",
+            "Doctype",
+        ],
+        ["gvkey", "name", "row_number", "page_number", "filing_date", "doctype"],
+    ),
+    "metadata": (
+        "metadata.csv",
+        [
+            "Filename",
+            "GVKey",
+            "HH Name",
+            "Mergent Name",
+            "Year",
+            "Date",
+            "DocType",
+            "Parent Zip",
+        ],
+        [
+            "filename",
+            "gvkey",
+            "name_hh",
+            "name_mergent",
+            "year",
+            "date",
+            "doctype",
+            "path",
+        ],
+    ),
+    "matching": (
+        "matching.csv",
+        [
+            "GVKey",
+            "Company Name",
+            "Year",
+            "Data Date",
+            "Status",
+            "Year Match",
+            "File Count",
+        ],
+        ["gvkey", "name", "year", "data_date", "status", "year_match", "file_count"],
+    ),
+    "confirmations": (
+        "confirmations.csv",
+        [
+            "Path",
+            "GVKey",
+            "HH Name",
+            "Mergent Name",
+            "Year",
+            "Doctype Confirmed",
+            "Name Confirmed",
+            "Year Confirmed",
+            "Index in missing.csv",
+        ],
+        [
+            "path",
+            "gvkey",
+            "name_hh",
+            "name_mergent",
+            "year",
+            "doctype_confirmed",
+            "name_confirmed",
+            "year_confirmed",
+            "missing_index",
+        ],
+    ),
+    "complexities": (
+        "complexities.csv",
+        ["GVKey", "HH Name", "Year", "Complexity"],
+        ["gvkey", "name_hh", "year", "complexity"],
+    ),
+}
+
+# Lookup copy of ARC_HH_OK_AR_missing.csv, row_index counts the header as 0 like GetMissingIndex
+MISSING_COLUMNS = ["row_index", "gvkey", "name", "year"]
+
+# Scraped results grid per search page, kind is the doctype filter ("ANR" or "ALL"),
+# rows is a json list of the grid's rows and scraped_at a unix time
+SEARCH_CACHE_COLUMNS = [
+    "term",
+    "kind",
+    "page",
+    "page_count",
+    "report_count",
+    "rows",
+    "scraped_at",
+]
+
+# Zips unzipped into /folders by unzipper.py: size and mtime_ns of the zip when it was extracted,
+# fingerprint a hash of its central directory and members a json list of the files extracted
+UNZIP_MANIFEST_COLUMNS = ["zip", "size", "mtime", "fingerprint", "members"]
+
+# Tables without a csv file: column names
+INTERNAL_TABLES = {
+    "missing": MISSING_COLUMNS,
+    "searchcache": SEARCH_CACHE_COLUMNS,
+    "unzipmanifest": UNZIP_MANIFEST_COLUMNS,
+}
+
+INDEXES = {
+    "ziptracker": [["gvkey"]],
+    "filestracker": [["gvkey"], ["gvkey", "page_number"]],
+    "metadata": [["gvkey"], ["gvkey", "year"], ["filename"]],
+    "matching": [["gvkey"], ["gvkey", "year"]],
+    "confirmations": [["gvkey"], ["gvkey", "year"], ["path"]],
+    "complexities": [["gvkey"], ["gvkey", "year"]],
+    "missing": [["gvkey", "year"], ["name", "year"]],
+    "searchcache": [["term", "kind"]],
+    "unzipmanifest": [["zip"]],
+}
+
+connection = None
+lock = threading.RLock()  # One connection is shared by every thread
+
+
+def Connect(path=None):
+    """
+    Opens runstate.db, creating tables and importing existing csv files on first use
+
+    path -- optional database path, defaults to db_path
+    Return: sqlite3 connection
+    """
+    global connection
+
+    with lock:
+        if connection is None:
+            connection = sqlite3.connect(path or db_path, check_same_thread=False)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=FULL")  # commits are fsynced
+
+            for table, (csv_path, header, columns) in TABLES.items():
+                if CreateTable(table, columns) and os.path.exists(csv_path):
+                    ImportCsv(table, csv_path)
+
+            for table, columns in INTERNAL_TABLES.items():
+                CreateTable(table, columns)
+            connection.commit()
+
+    return connection
+
+
+def CreateTable(table, columns):
+    """
+    Creates table and its indexes if they do not exist
+
+    table -- table name
+    columns -- list of column names, all stored as text
+    Return: bool, true if the table was newly created
+    """
+    exists = connection.execute(
+        "SELECT 1 FROM sqlite_master WHERE type='table' AND name=?", (table,)
+    ).fetchone()
+
+    if not exists:
+        connection.execute(
+            "CREATE TABLE "
+            + table
+            + " (seq INTEGER PRIMARY KEY AUTOINCREMENT, "
+            + ", ".join(column + " TEXT" for column in columns)
+            + ")"
+        )
+
+    for index_columns in INDEXES.get(table, []):
+        connection.execute(
+            "CREATE INDEX IF NOT EXISTS "
+            + table
+            + "_"
+            + "_".join(index_columns)
+            + " ON "
+            + table
+            + " ("
+            + ", ".join(index_columns)
+            + ")"
+        )
+
+    return not exists
+
+
+def ImportCsv(table, csv_path):
+    """
+    Appends every row of csv_path (minus header) to table
+
+    Return: void
+    """
+    with open(csv_path, "r", newline="") as file:
+        reader = csv.reader(file)
+        next(reader, None)  # skip header
+        InsertMany(table, (row for row in reader if row))
+
+
+def Columns(table):
+    """
+    Return: list of column names for table
+    """
+    if table in INTERNAL_TABLES:
+        return INTERNAL_TABLES[table]
+    return TABLES[table][2]
+
+
+def Insert(table, row):
+    """
+    Appends one row to table, not committed until Commit
+
+    row -- list of values, stored as strings
+    Return: void
+    """
+    InsertMany(table, [row])
+
+
+def InsertMany(table, rows):
+    """
+    Appends rows to table, not committed until Commit
+
+    rows -- iterable of lists of values, stored as strings
+    Return: void
+    """
+    columns = Columns(table)
+    with lock:
+        Connect().executemany(
+            "INSERT INTO "
+            + table
+            + " ("
+            + ", ".join(columns)
+            + ") VALUES ("
+            + ", ".join("?" for column in columns)
+            + ")",
+            ([str(value) for value in row] for row in rows),
+        )
+
+
+def Rows(table):
+    """
+    Return: every row of table as a list of strings, in insertion order
+    """
+    return Select(table)
+
+
+def Select(table, **where):
+    """
+    Returns rows of table whose columns equal the given values, in insertion order
+
+    where -- column=value pairs, all must match
+    Return: list of lists of strings
+    """
+    query = "SELECT " + ", ".join(Columns(table)) + " FROM " + table
+    if where:
+        query += " WHERE " + " AND ".join(column + "=?" for column in where)
+    query += " ORDER BY seq"
+
+    with lock:
+        return [
+            list(row)
+            for row in Connect().execute(query, [str(v) for v in where.values()])
+        ]
+
+
+def Contains(table, row):
+    """
+    row -- list of values in column order
+    Return: bool, true if an identical row exists in table
+    """
+    where = dict(zip(Columns(table), row))
+    query = (
+        "SELECT 1 FROM "
+        + table
+        + " WHERE "
+        + " AND ".join(column + "=?" for column in where)
+        + " LIMIT 1"
+    )
+    with lock:
+        return (
+            Connect().execute(query, [str(v) for v in where.values()]).fetchone()
+            is not None
+        )
+
+
+def Delete(table, **where):
+    """
+    Deletes rows of table whose columns equal the given values, not committed until Commit
+
+    where -- column=value pairs, all must match
+    Return: void
+    """
+    with lock:
+        Connect().execute(
+            "DELETE FROM "
+            + table
+            + " WHERE "
+            + " AND ".join(column + "=?" for column in where),
+            [str(v) for v in where.values()],
+        )
+
+
+def Clear(table):
+    """
+    Deletes every row of table, used where a stage used to rewrite its csv
+
+    Return: void
+    """
+    with lock:
+        Connect().execute("DELETE FROM " + table)
+        connection.commit()
+
+
+def Commit():
+    """
+    Commits pending inserts, synced to disk
+
+    Return: void
+    """
+    with lock:
+        Connect().commit()
+
+
+def LoadMissing(csv_path=None):
+    """
+    Reloads the missing table from ARC_HH_OK_AR_missing.csv
+
+    Return: void
+    """
+    with lock:
+        Connect().execute("DELETE FROM missing")
+        with open(csv_path or missing_csv, "r", newline="") as file:
+            reader = csv.reader(file)
+            next(reader)  # skip titles
+            InsertMany(
+                "missing",
+                (
+                    [index, row[1], row[16], row[9]]  # gvkey, company name, year
+                    for index, row in enumerate(reader, 1)
+                ),
+            )
+        connection.commit()
+
+
+def MissingIndices(key, name, year):
+    """
+    Finds rows in ARC_HH_OK_AR_missing.csv for a year with either a matching gvkey or name
+
+    Return: list of ints in file order
+    """
+    with lock:
+        return [
+            row[0]
+            for row in Connect().execute(
+                "SELECT CAST(row_index AS INTEGER) AS i FROM missing WHERE year=? AND gvkey=? "
+                "UNION SELECT CAST(row_index AS INTEGER) FROM missing WHERE year=? AND name=? "
+                "ORDER BY i",
+                (year, key, year, name),
+            )
+        ]
+
+
+# Tables whose csv writer skipped rows the platform encoding cannot write, every other table raises
+SKIP_UNENCODABLE = ["confirmations"]
+
+
+def ExportCsv(table, csv_path=None):
+    """
+    Writes table out as its csv file, header first
+
+    table -- table name
+    csv_path -- optional override of the csv location
+    Return: void
+    """
+    default_path, header, columns = TABLES[table]
+    csv_path = csv_path or default_path
+
+    if os.path.dirname(csv_path):
+        os.makedirs(os.path.dirname(csv_path), exist_ok=True)
+
+    # Write to a temp file first so readers never see a partial csv
+    temp_path = csv_path + ".tmp"
+    skipped = []
+    try:
+        with open(temp_path, "w", newline="") as file:
+            writer = csv.writer(file)
+            writer.writerow(header)
+            for row in Rows(table):
+                try:
+                    writer.writerow(row)
+                except UnicodeEncodeError:
+                    if table not in SKIP_UNENCODABLE:
+                        raise
+                    skipped.append(row)
+        os.replace(temp_path, csv_path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+    if skipped:
+        print(
+            "Skipped "
+            + str(len(skipped))
+            + " rows of "
+            + table
+            + " the platform encoding cannot write: "
+            + "; ".join(", ".join(row[:2]) for row in skipped)
+        )
+
+
+def ExportAll():
+    """
+    Writes every table out to its csv file
+
+    Return: void
+    """
+    for table in TABLES:
+        ExportCsv(table)
+
+
+def Close():
+    """
+    Commits and closes the connection
+
+    Return: void
+    """
+    global connection
+
+    with lock:
+        if connection is not None:
+            connection.commit()
+            connection.close()
+            connection = None
+
+
+if __name__ == "__main__":
+    # Export every table, for downstream users of the csv files
+    ExportAll()
@@ -0,0 +1,67 @@
+"""
+Pipelined bulk downloads: BulkDownload(wait=False) must hand back the completion instead of
+blocking, and the scheduler must be settled with the size of the zip once it completes
+
+python -m unittest discover tests
+"""
+
+import os
+import sys
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+try:
+    import downloadscript
+except ImportError:  # selenium and alive-progress are needed to import downloadscript
+    downloadscript = None
+
+
+@unittest.skipIf(downloadscript is None, "downloadscript dependencies not installed")
+class PipelineTest(unittest.TestCase):
+    def Patch(self, target, name, *args, **kwargs):
+        patcher = mock.patch.object(target, name, *args, **kwargs)
+        self.addCleanup(patcher.stop)
+        return patcher.start()
+
+    def setUp(self):
+        # Buttons are found at once and the grid is always settled
+        waiter = self.Patch(downloadscript, "WebDriverWait")
+        waiter.return_value.until.return_value = mock.MagicMock()
+        self.Patch(downloadscript.downloadwatcher, "Arm")
+        self.rename = self.Patch(
+            downloadscript, "CompleteDownloadAndRename", return_value=1234.0
+        )
+        self.driver = mock.MagicMock()
+
+    def test_no_wait_returns_completion(self):
+        complete = downloadscript.BulkDownload(
+            self.driver, "001004_AAR-CORP_1", False, wait=False
+        )
+        self.assertTrue(callable(complete))
+        self.rename.assert_not_called()  # the download is not waited on yet
+        self.assertEqual(complete(), 1234.0)
+
+    def test_pipelined_download_settles_real_size(self):
+        scheduler = self.Patch(downloadscript, "scheduler")
+        check = self.Patch(downloadscript, "QueueZipCheck")
+        self.Patch(downloadscript, "pipelined_kb", 0.0)
+        self.Patch(downloadscript, "pipelined", False)
+        self.Patch(downloadscript, "in_flight", None)
+        downloadscript.EnablePipeline()
+
+        returned = downloadscript.ScheduledDownload(
+            self.driver, mock.MagicMock(), "001004_AAR-CORP_1", False, 2000
+        )
+        downloadscript.DrainCompletions()
+
+        self.assertEqual(returned, 0)  # counted in pipelined_kb instead
+        entry = scheduler.Acquire.return_value
+        scheduler.Settle.assert_called_once_with(entry, 1234.0)
+        check.assert_called_once_with("001004_AAR-CORP_1", None, 1234.0)
+        self.assertEqual(downloadscript.pipelined_kb, 1234.0)
+
+
+if __name__ == "__main__":
+    unittest.main()
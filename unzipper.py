@@ -0,0 +1,229 @@
+"""
+Parallel extraction of downloaded zips into /folders
+
+Zips are extracted several at once on a process pool. Each one is extracted into a folder of its own
+under /folders.partial and renamed into /folders only once every member is written, so a folder in
+/folders is always complete and a crash mid-extraction leaves nothing behind but a partial folder,
+which is removed on the next run. Extract yields each zip as it finishes, so verifyscript indexes the
+first folders while the rest are still extracting.
+
+Every extraction is recorded in the unzipmanifest table of runstate.db with the zip's size, mtime, a
+hash of its central directory and the files extracted. A rerun skips a zip whose size and mtime match
+its manifest row with one stat, extracts a zip again if it was replaced by a new download, and lists
+folders left without a zip. Folders unzipped before the manifest are checked once against their zip.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import time
+import zipfile
+import zlib
+import runstate
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+extracted = [0, 0, 0.0, 0]  # zips extracted, bytes written, seconds spent, zips extracted again
+orphans = []  # folders without a zip, found by the last Extract
+
+
+def PartialDirectory(folder_directory):
+    """
+    Return: folder holding extractions in progress, beside folder_directory so renames stay on one disk
+    """
+    return os.path.normpath(folder_directory) + ".partial"
+
+
+def Fingerprint(infos):
+    """
+    infos -- ZipInfo list of a zip
+    Return: hex sha1 of the name, CRC and size of every member, as listed in the central directory
+    """
+    digest = hashlib.sha1()
+    for info in infos:
+        digest.update(
+            (info.filename + ":" + str(info.CRC) + ":" + str(info.file_size) + "\n").encode()
+        )
+    return digest.hexdigest()
+
+
+def FolderMatches(folder_path, infos):
+    """
+    Return: bool, true if folder_path holds every member of a zip at its full size
+    """
+    try:
+        return all(
+            os.path.getsize(os.path.join(folder_path, info.filename)) == info.file_size
+            for info in infos
+            if not info.is_dir()
+        )
+    except OSError:
+        return False
+
+
+def ExtractOne(zip_path, folder_path, partial_path, reuse=False, fingerprint=None):
+    """
+    Extracts a zip into partial_path, then renames it to folder_path, replacing any folder there.
+    Runs on the pool.
+
+    zip_path -- zip to extract
+    folder_path -- final folder
+    partial_path -- folder extracted into first, removed if extraction fails
+    reuse -- bool, keep an existing folder_path that already holds every member
+    fingerprint -- fingerprint recorded when folder_path was extracted, the folder is only kept if it
+                   still matches, None if unknown
+    Return: tuple (bytes written, None or string describing why the zip could not be extracted,
+            fingerprint, list of members, bool true if the folder was kept)
+    """
+    try:
+        with zipfile.ZipFile(zip_path, "r") as zip_ref:
+            infos = zip_ref.infolist()
+            members = [info.filename for info in infos]
+            if (
+                reuse
+                and fingerprint in [None, Fingerprint(infos)]
+                and FolderMatches(folder_path, infos)
+            ):
+                return 0, None, Fingerprint(infos), members, True
+
+            size = sum(info.file_size for info in infos)
+            zip_ref.extractall(partial_path)
+
+        if os.path.exists(folder_path):
+            # Swap the new folder in, a crash in between leaves no folder and the zip is extracted again
+            stale_path = partial_path + ".stale"
+            os.rename(folder_path, stale_path)
+            os.rename(partial_path, folder_path)
+            shutil.rmtree(stale_path, ignore_errors=True)
+        else:
+            os.rename(partial_path, folder_path)
+        return size, None, Fingerprint(infos), members, False
+    except (zipfile.BadZipFile, zlib.error, EOFError, OSError) as error:
+        shutil.rmtree(partial_path, ignore_errors=True)
+        return 0, type(error).__name__ + ": " + str(error), None, [], False
+
+
+def LoadManifest():
+    """
+    Return: dict of zip name: (size, mtime, fingerprint) from the unzipmanifest table
+    """
+    return {
+        name: (size, mtime, fingerprint)
+        for name, size, mtime, fingerprint, members in runstate.Rows("unzipmanifest")
+    }
+
+
+def Record(name, stat, fingerprint, members):
+    """
+    Replaces a zip's manifest row
+
+    name -- zip name
+    stat -- os.stat_result of the zip when it was extracted
+    Return: void
+    """
+    with runstate.lock:
+        runstate.Delete("unzipmanifest", zip=name)
+        runstate.Insert(
+            "unzipmanifest",
+            [name, stat.st_size, stat.st_mtime_ns, fingerprint, json.dumps(members)],
+        )
+        runstate.Commit()
+
+
+def Extract(zip_directory, folder_directory, workers=None):
+    """
+    Extracts every zip in zip_directory that is new or changed since it was last extracted
+
+    zip_directory -- folder of downloaded zips
+    folder_directory -- folder holding one folder per zip, named as the zip without ".zip"
+    workers -- processes extracting at once, defaults to one per core
+    Return: generator of (zip name, folder path, status) in the order zips finish, status is "extracted",
+            "exists" for zips unchanged since an earlier run, or why the zip could not be extracted
+    """
+    partial_directory = PartialDirectory(folder_directory)
+    shutil.rmtree(partial_directory, ignore_errors=True)  # left by a run that crashed
+    os.makedirs(partial_directory)
+
+    start = time.monotonic()
+    extracted[:] = [0, 0, 0.0, 0]
+    manifest = LoadManifest()
+    zip_names = sorted(
+        name for name in os.listdir(zip_directory) if name.endswith(".zip")
+    )  # .zip.bad files set aside by downloadscript are left out
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {}
+        for filename in zip_names:
+            zip_path = os.path.join(zip_directory, filename)
+            folder_path = os.path.join(folder_directory, filename[:-4])
+            stat = os.stat(zip_path)
+            exists = os.path.exists(folder_path)
+
+            recorded = manifest.get(filename)
+            if (
+                exists
+                and recorded is not None
+                and recorded[:2] == (str(stat.st_size), str(stat.st_mtime_ns))
+            ):
+                yield filename, folder_path, "exists"
+                continue
+
+            future = pool.submit(
+                ExtractOne,
+                zip_path,
+                folder_path,
+                os.path.join(partial_directory, filename[:-4]),
+                exists,  # kept if only the mtime changed, or unzipped before the manifest and complete
+                recorded[2] if recorded is not None else None,
+            )
+            futures[future] = (filename, folder_path, stat, recorded)
+
+        for future in as_completed(futures):
+            filename, folder_path, stat, recorded = futures[future]
+            size, error, fingerprint, members, kept = future.result()
+            extracted[2] = time.monotonic() - start
+            if error is not None:
+                yield filename, folder_path, error
+                continue
+
+            Record(filename, stat, fingerprint, members)
+            if kept:
+                yield filename, folder_path, "exists"
+                continue
+
+            extracted[0] += 1
+            extracted[1] += size
+            if recorded is not None and recorded[2] != fingerprint:
+                extracted[3] += 1
+            yield filename, folder_path, "extracted"
+
+    shutil.rmtree(partial_directory, ignore_errors=True)
+
+    # Folders and manifest rows whose zip is gone, such as zips set aside as .zip.bad
+    zip_folders = {name[:-4] for name in zip_names}
+    orphans[:] = sorted(
+        name for name in os.listdir(folder_directory) if name not in zip_folders
+    )
+    with runstate.lock:
+        for name in set(manifest) - set(zip_names):
+            runstate.Delete("unzipmanifest", zip=name)
+        runstate.Commit()
+
+
+def Report():
+    """
+    Return: string summary of the last Extract
+    """
+    count, size, seconds, changed = extracted
+    return (
+        str(count)
+        + " zips ("
+        + str(changed)
+        + " replaced since last unzipped), "
+        + str(round(size / 1000000.0, 1))
+        + "MB in "
+        + str(round(seconds, 1))
+        + "s, "
+        + str(round(size / 1000000.0 / seconds, 1) if seconds > 0 else 0)
+        + "MB/s"
+    )
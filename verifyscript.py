@@ -11,16 +11,18 @@ By Evan Fioritto
 """
 
 import downloadscript
+import runstate
+import phasetrace
+import unzipper
+import docstore
 import os
 import zipfile
 import csv
-import fitz
 import pymupdf
 import pandas as pd
 from PyPDF2.errors import PdfReadError
 from rapidfuzz import fuzz
 from alive_progress import alive_bar
-from getpass import getpass
 
 zip_directory = "./zips"
 folder_directory = "./folders"
@@ -42,85 +44,73 @@ def InitializeFiles():
         if not os.path.exists(dir):
             os.mkdir(dir)
 
-    # Write headers
-    with open("metadata.csv", "w", newline="") as csvfile:
-        w = csv.writer(csvfile)
-        w.writerow(
-            [
-                "Filename",
-                "GVKey",
-                "HH Name",
-                "Mergent Name",
-                "Year",
-                "Date",
-                "DocType",
-                "Parent Zip",
-            ]
-        )
-
-    with open("confirmations.csv", "w", newline="") as csvfile:
-        w = csv.writer(csvfile)
-        w.writerow(
-            [
-                "Path",
-                "GVKey",
-                "HH Name",
-                "Mergent Name",
-                "Year",
-                "Doctype Confirmed",
-                "Name Confirmed",
-                "Year Confirmed",
-                "Index in missing.csv",
-            ]
-        )
+    # Clear tables rebuilt by this run
+    runstate.Clear("metadata")
+    runstate.Clear("confirmations")
 
 
 def UnzipFiles():
     """
-    Unzips all files in zips to folders
+    Unzips all files in zips to folders, several zips at once, see unzipper.py.
+    Each folder is indexed for GetFileInfo as soon as its zip finishes, while the rest extract.
 
     Return: void
     """
+    zip_count = len([name for name in os.listdir(zip_directory) if name.endswith(".zip")])
 
     # Create Progress bar
-    with alive_bar(len(os.listdir(zip_directory))) as bar:
+    with alive_bar(zip_count) as bar:
         bar.text("Unzipping")
-        # Iterate through zips folder
-        for filename in os.listdir(zip_directory):
-
-            # Create new subfolder based on filename
-            path = os.path.join(
-                folder_directory, filename[:-4]
-            )  # indexing up to -4 gets string except for ".zip" extension
-            if not os.path.exists(path):
-                os.mkdir(path)  # create subfolder
-                # Extract
-                f = os.path.join(zip_directory, filename)  # Get path of each zip
-
-                # If possible, extract the zip
-                try:
-                    with zipfile.ZipFile(f, "r") as zip_ref:
-                        zip_ref.extractall(path)
-                except zipfile.BadZipFile:
-                    continue
-                except zipfile.zlib.error:
-                    continue
+        for filename, path, status in unzipper.Extract(zip_directory, folder_directory):
+            if status in ["extracted", "exists"]:
+                folder_rows[os.path.basename(path)] = IndexFolder(path)
+            else:
+                print("Could not unzip " + filename + ": " + status)
             bar()
 
+    print("Unzipped " + unzipper.Report())
+    if unzipper.orphans:
+        print(
+            str(len(unzipper.orphans))
+            + " folders without a zip in "
+            + zip_directory
+            + ": "
+            + ", ".join(unzipper.orphans)
+        )
 
-def GetFileInfo(key, zip_page, row_number):
+
+folder_index = None  # (gvkey, page): {row number: (file name, path)}, built by IndexFolders
+folder_rows = {}  # folder name: IndexFolder result, filled by UnzipFiles and used once by IndexFolders
+
+
+def IndexFolder(folder_path):
     """
-    uses key, page of zip, and file row number to return file name and path
+    Indexes the files of one extracted zip (or one zip, when reading from zips), in listing order
 
-    Keyword arguments:
-    key -- company gvkey, derived from ziptracker
-    zip_page -- page # that the zip was downloaded from, derived from ziptracker
-    row_number -- row of the file we want information from, derived from filestracker
-    Return: [0] is file name, the string given by mergent, [1] is the local path to the file
+    folder_path -- path from docstore.Folders
+    Return: dict of row number: (file name, path) of the first file found for each row
+    """
+    rows = {}
+    for file_name in docstore.Files(folder_path):
+        # Files are named <document id>_<row>.pdf, the row follows the last underscore
+        file_number = file_name[:-4].split("_")[-1].strip()
+        if file_number not in rows:
+            rows[file_number] = (file_name, os.path.join(folder_path, file_name))
+    return rows
+
+
+def IndexFolders():
     """
+    Indexes every file of every extracted zip (or every zip, when reading from zips) in one pass.
+    Folders and files are visited in listing order and the first file found for a row is kept,
+    which is the file GetFileInfo used to return. Folders already indexed by UnzipFiles are not
+    listed again.
 
-    # Iterate through each extracted zip
-    for folder_name in os.listdir(folder_directory):
+    Return: dict of (gvkey, page): {row number: (file name, path)}
+    """
+    index = {}
+
+    for folder_name, folder_path in docstore.Folders():
 
         folder_name_list = folder_name.split(
             "_"
@@ -132,28 +122,43 @@ def GetFileInfo(key, zip_page, row_number):
         else:
             file_page = folder_name_list[-1]
 
-        if (
-            key == folder_name_list[0] and zip_page == file_page
-        ):  # Identifyin information for the folder is its gvkey and download page
+        # Identifying information for the folder is its gvkey and download page
+        rows = index.setdefault((folder_name_list[0], file_page), {})
 
-            folder_path = os.path.join(folder_directory, folder_name)
+        folder = folder_rows.pop(folder_name, None)
+        if folder is None or docstore.from_zips:
+            folder = IndexFolder(folder_path)
+        for file_number, file_info in folder.items():
+            rows.setdefault(file_number, file_info)
 
-            # Iterate through files in folder
-            for file_name in os.listdir(folder_path):
+    folder_rows.clear()  # indexed once, later calls list the folders again
+    return index
 
-                file_number = file_name[:-4].strip()[-1]  # Grab row of file from path
-                if file_number == row_number:  # Find target
 
-                    file_path = os.path.join(folder_path, file_name)
+def GetFileInfo(key, zip_page, row_number):
+    """
+    uses key, page of zip, and file row number to return file name and path
+
+    Keyword arguments:
+    key -- company gvkey, derived from ziptracker
+    zip_page -- page # that the zip was downloaded from, derived from ziptracker
+    row_number -- row of the file we want information from, derived from filestracker
+    Return: [0] is file name, the string given by mergent, [1] is the local path to the file
+    """
+    global folder_index
 
-                    return file_name, file_path
+    if folder_index is None:
+        folder_index = IndexFolders()
 
-    return 0, 0  # If iteration is complete with no matches, return 0s
+    # If no file matches, return 0s
+    return folder_index.get((key, zip_page), {}).get(row_number, (0, 0))
 
 
 def OpenTrackers():
     """
-    Iterate through both trackers, grabbing neccesary data from each for appendage into metadata csv
+    Iterate through both trackers, grabbing neccesary data from each for appendage into metadata csv.
+    Joined in memory: filestracker is read once and grouped by gvkey, each zip's files are looked up
+    through the folder index and used file names are kept in a set.
 
     Return: void
     """
@@ -161,65 +166,60 @@ def OpenTrackers():
     # Too long or not available
     invalids = ["TL", "NA", "SK"]
 
-    # Open both trackers
-    with open(tracker_directory + "/ziptracker.csv", newline="") as csvfile1:
-
-        zip_reader = csv.reader(csvfile1)
-        used_files = []
-        next(zip_reader)  # Skip header
-
-        # Use panda to get a length for csv
-        num_lines = len(pd.read_csv(tracker_directory + "/ziptracker.csv"))
-
-        with alive_bar(num_lines) as bar:  # Progress bar
-            bar.text("Pulling Metadata")
-
-            for zip in zip_reader:
-                key = zip[0]
-                name_HH = zip[1]
-                zip_page = zip[2]  # Could be "TL","NA","SK" or int value
-
-                if zip_page not in invalids:
-
-                    with open(
-                        tracker_directory + "/filestracker.csv", newline=""
-                    ) as csvfile2:
-                        file_reader = csv.reader(csvfile2)
-                        next(file_reader)  # Skip header
-
-                        for file in file_reader:
-                            file_key = file[0]
-                            name_mergent = file[1]
-                            row_number = file[2]
-                            file_date = file[4]
-                            doctype = file[5]
-
-                            if file_key == key:
-                                file_info = GetFileInfo(key, zip_page, row_number)
-
-                                if (file_info[0] and file_info[1]) and (
-                                    file_info[0] not in used_files
-                                ):
-                                    used_files.append(
-                                        file_info[0]
-                                    )  # Files must be unique
-
-                                    MetadataAppend(
-                                        file_info[0],
-                                        key,
-                                        name_HH,
-                                        name_mergent,
-                                        file_date[-4:],
-                                        file_date,
-                                        doctype,
-                                        file_info[1],
-                                    )
-                bar()
+    global folder_index
+
+    used_files = set()
+    zip_rows = runstate.Rows("ziptracker")
+    folder_index = IndexFolders()  # folders may have changed since the last call
+
+    # Every firm's files, in tracker order
+    firm_files = {}
+    for file in runstate.Rows("filestracker"):
+        firm_files.setdefault(file[0], []).append(file)
+
+    with alive_bar(len(zip_rows)) as bar:  # Progress bar
+        bar.text("Pulling Metadata")
+
+        for zip in zip_rows:
+            key = zip[0]
+            name_HH = zip[1]
+            zip_page = zip[2]  # Could be "TL","NA","SK" or int value
+
+            if zip_page not in invalids:
+
+                # Only this firm's files
+                for file in firm_files.get(key, []):
+                    name_mergent = file[1]
+                    row_number = file[2]
+                    file_date = file[4]
+                    doctype = file[5]
+
+                    file_info = GetFileInfo(key, zip_page, row_number)
+
+                    if (file_info[0] and file_info[1]) and (
+                        file_info[0] not in used_files
+                    ):
+                        used_files.add(file_info[0])  # Files must be unique
+
+                        MetadataAppend(
+                            file_info[0],
+                            key,
+                            name_HH,
+                            name_mergent,
+                            file_date[-4:],
+                            file_date,
+                            doctype,
+                            file_info[1],
+                        )
+            bar()
+
+    runstate.Commit()
+    runstate.ExportCsv("metadata")
 
 
 def MetadataAppend(filename, key, name_HH, name_mergent, year, date, doctype, path):
     """
-    Appends parameters to metadata.csv
+    Appends parameters to the metadata table
 
     filename -- string generated by mergent
     key -- gvkey for company
@@ -241,15 +241,10 @@ def MetadataAppend(filename, key, name_HH, name_mergent, year, date, doctype, pa
         str(doctype),
         str(path),
     ]
-    with open("metadata.csv", "r", newline="") as file:
-        reader = csv.reader(file)
-        for row in reader:
-            if row == temp:  # If row exists we will not rewrite
-                return 0
+    if runstate.Contains("metadata", temp):  # If row exists we will not rewrite
+        return 0
 
-    with open("metadata.csv", "a", newline="") as file:
-        writer = csv.writer(file)
-        writer.writerow(temp)
+    runstate.Insert("metadata", temp)
 
 
 def ValidateMatches():
@@ -259,40 +254,16 @@ def ValidateMatches():
     Return: void
     """
 
-    with open("matching.csv", "w", newline="") as csvfile:
-        w = csv.writer(csvfile)
-        w.writerow(
-            [
-                "GVKey",
-                "Company Name",
-                "Year",
-                "Data Date",
-                "Status",
-                "Year Match",
-                "File Count",
-            ]
-        )
+    runstate.Clear("matching")
 
     valid_doctypes = ["10K or Int'l Equivalent", "Annual/10K Report", "Annual Report"]
     na_statuses = ["NA", "TL", "SK"]
-    downloaded_files = []
 
     # Use panda to get a length for csv
     num_lines = len(
         pd.read_csv("ARC_HH_OK_AR_missing.csv", low_memory=False)
     )  # Low_memory=false removes warnings
 
-    # Need all files in a list to get dates for files
-    with open(tracker_directory + "/filestracker.csv", "r", newline="") as files_file:
-        files_reader = csv.reader(files_file)
-        next(files_reader)
-
-        for files_row in files_reader:
-            if (
-                files_row[5] in valid_doctypes
-            ):  # only care about valid doctypes, this will make other doctypes appear as N in the matching year column in matching.csv, signalling no file match
-                downloaded_files.append(files_row)
-
     with alive_bar(num_lines) as bar:  # Progress bar
         bar.text("Validating ARC_missing.csv matches with files")
 
@@ -310,30 +281,26 @@ def ValidateMatches():
                 year_match = "N"
                 file_count = 0
 
-                with open(
-                    tracker_directory + "/ziptracker.csv", "r", newline=""
-                ) as zips_file:
-                    zips_reader = csv.reader(zips_file)
-                    next(zips_reader)  # Skip headers
-
-                    for zips_row in zips_reader:
+                for zips_row in runstate.Select("ziptracker", gvkey=key):
 
-                        if zips_row[0] == key:  # GVkeys match
+                    if zips_row[2] not in na_statuses:
+                        status = "OK"
 
-                            if zips_row[2] not in na_statuses:
-                                status = "OK"
-
-                            if status != "OK":
-                                if zips_row[2] in na_statuses:
-                                    status = zips_row[2]
-                                else:
-                                    status = "NA"
+                    if status != "OK":
+                        if zips_row[2] in na_statuses:
+                            status = zips_row[2]
+                        else:
+                            status = "NA"
 
                 # If an entry has a file match, we will check the year
                 if status == "OK":
 
-                    for item in downloaded_files:
-                        if (item[4].split("/")[-1] == year) and item[0] == key:
+                    for item in runstate.Select("filestracker", gvkey=key):
+                        # only care about valid doctypes, this will make other doctypes appear as N in the matching year column in matching.csv, signalling no file match
+                        if (
+                            item[5] in valid_doctypes
+                            and item[4].split("/")[-1] == year
+                        ):
                             year_match = "Y"
                             file_count += 1
                 bar()
@@ -346,6 +313,9 @@ def ValidateMatches():
                     key, name, year, data_date, status, year_match, file_count
                 )
 
+    runstate.Commit()
+    runstate.ExportCsv("matching")
+
 
 def CreateMissingYearsDict():
     """
@@ -357,18 +327,15 @@ def CreateMissingYearsDict():
 
     ret = {}
 
-    with open("matching.csv", "r", newline="") as file:
-        reader = csv.reader(file)
+    for row in runstate.Rows("matching"):
 
-        for row in reader:
+        if row[4] == "OK" and row[5] == "N":  # gap year criteria
 
-            if row[4] == "OK" and row[5] == "N":  # gap year criteria
+            if row[0] not in ret:  # need to specify type on first encounter
+                ret[row[0]] = (row[1], [row[2]])
 
-                if row[0] not in ret:  # need to specify type on first encounter
-                    ret[row[0]] = (row[1], [row[2]])
-
-                else:  # if key has been created, we will add years
-                    ret[row[0]][1].append(row[2])
+            else:  # if key has been created, we will add years
+                ret[row[0]][1].append(row[2])
 
     return ret
 
@@ -380,15 +347,24 @@ def TertiaryCheck():
 
     missing_years_dict = CreateMissingYearsDict()
 
-    # Need a webdriver as we will be downloading files in this function
-    driver = downloadscript.CreateDriver()
-    downloadscript.CompleteAuth(
-        driver,
-        input("Input a valid msu email to access mergent archives.\n"),
-        getpass("Input a valid msu password.\n"),
-    )
+    # Gap years already covered by unfiltered zips on disk need no search
+    downloadscript.LoadInventory()
+    missing_years_dict = {
+        key: val_list
+        for key, val_list in missing_years_dict.items()
+        if not downloadscript.YearsOnDisk(key, val_list[1])
+    }
+
+    # Need a webdriver as we will be downloading files in this function, a persistent
+    # profile may still be logged in, so credentials are only asked for if needed
+    credentials = []
+    driver = downloadscript.OpenSession(credentials)
 
-    amt_downloaded_kb = 0.0  # needs to stay under 1800000 kb #should be zero
+    def Reopen():
+        return downloadscript.OpenSession(credentials)
+
+    amt_downloaded_kb = 0.0  # total kb downloaded, the cap is kept by downloadscript.scheduler
+    downloadscript.scheduler.Seed(downloadscript.GetDownloadDirectory())
 
     with alive_bar(len(missing_years_dict)) as bar:  # Progress bar
 
@@ -397,21 +373,35 @@ def TertiaryCheck():
 
         for key, val_list in missing_years_dict.items():
 
-            amt_downloaded_kb = downloadscript.CheckAndWait(bar, amt_downloaded_kb)
+            downloadscript.scheduler.Wait(bar)  # Waits only while the last hour is at the cap
 
-            amt_downloaded_kb = downloadscript.SearchActions(
-                driver, bar, key, val_list[0], amt_downloaded_kb, True, val_list[1]
-            )  # search all will be true,
+            with phasetrace.Firm(key, val_list[0]):
+                amt_downloaded_kb = downloadscript.SearchActions(
+                    driver, bar, key, val_list[0], amt_downloaded_kb, True, val_list[1]
+                )  # search all will be true,
 
             bar.text(str(amt_downloaded_kb / 1000000.0) + "GB Downloaded")
             bar()
 
+            driver, amt_downloaded_kb = downloadscript.RetrySkipped(
+                driver, bar, amt_downloaded_kb, Reopen, wait=False
+            )
+
+        driver, amt_downloaded_kb = downloadscript.RetrySkipped(
+            driver, bar, amt_downloaded_kb, Reopen
+        )
+        downloadscript.DrainCompletions()
+        amt_downloaded_kb = downloadscript.RetryBadZips(driver, bar, amt_downloaded_kb)
+        downloadscript.GiveUpRetries()
+        print("Retries: " + downloadscript.RetrySummary())
+
+    downloadscript.CloseTrackers()
     driver.quit()
 
 
 def MatchingAppend(key, name, year, data_date, status, year_match, file_count):
     """
-    Appends parameters as a row into matching.csv
+    Appends parameters as a row into the matching table
 
     Keyword arguments:
     key -- GVkey for a firm
@@ -424,16 +414,10 @@ def MatchingAppend(key, name, year, data_date, status, year_match, file_count):
 
     temp = [key, name, year, data_date, status, year_match, file_count]
 
-    with open("matching.csv", "r", newline="") as file:
-        reader = csv.reader(file)
-
-        for row in reader:  # Avoid duplicate entries
-            if row == temp:
-                return 0
+    if runstate.Contains("matching", temp):  # Avoid duplicate entries
+        return 0
 
-    with open("matching.csv", "a", newline="") as file:
-        writer = csv.writer(file)
-        writer.writerow(temp)
+    runstate.Insert("matching", temp)
 
 
 def TypesAppend(
@@ -448,7 +432,7 @@ def TypesAppend(
     missing_index,
 ):
     """
-    Appends parameters to confirmations.csv
+    Appends parameters to the confirmations table
 
     Keyword arguments:
     path -- path to file on disk
@@ -473,18 +457,10 @@ def TypesAppend(
         str(year_confirmed),
         str(missing_index),
     ]
-    with open("confirmations.csv", "r", newline="") as file:
-        reader = csv.reader(file)
-        for row in reader:
-            if row == temp:
-                return 0
+    if runstate.Contains("confirmations", temp):
+        return 0
 
-    with open("confirmations.csv", "a", newline="") as file:
-        writer = csv.writer(file)
-        try:
-            writer.writerow(temp)
-        except UnicodeEncodeError:  # Thrown unexpectedly, cause not known
-            return 0
+    runstate.Insert("confirmations", temp)
 
 
 def VerifyAppearances(
@@ -556,18 +532,11 @@ def GetMissingIndex(key, HH_name, date, occs):
     Return: int or string
     """
 
-    with open("ARC_HH_OK_AR_missing.csv", "r", newline="") as file:
-        reader = csv.reader(file)
-        count = 0  # Index essentially
-
-        for row in reader:
-
-            if row[9] == date[-4:] and (row[1] == key or row[16] == HH_name):
+    # Candidate rows come from the (gvkey, year) and (name, year) indexes, in file order
+    for count in runstate.MissingIndices(key, HH_name, date[-4:]):
 
-                if count not in occs:  # Ensures unique indices
-                    return count  # Appendage of count to occs will be done outside of function, as list will be destroyed by scope
-
-            count += 1
+        if count not in occs:  # Ensures unique indices
+            return count  # Appendage of count to occs will be done outside of function, as set will be destroyed by scope
 
     return "NA"
 
@@ -578,94 +547,95 @@ def VerifyPdfs():
 
     Return: void
     """
-    occs = []  # Storage for occupied indices from ARC_missing.csv
+    occs = set()  # Storage for occupied indices from ARC_missing.csv
     total_count = 0
     found_count = 0
 
-    # Use panda to get length of csv
-    num_lines = len(pd.read_csv("metadata.csv"))
+    metadata_rows = runstate.Rows("metadata")
+    runstate.LoadMissing()  # GetMissingIndex reads ARC_HH_OK_AR_missing.csv through the store
+
+    with alive_bar(len(metadata_rows)) as bar:  # Initiliaze progress bar
+        bar.text("Verifying files")
+
+        for row in metadata_rows:
 
-    with open("metadata.csv", "r", newline="") as file:
-        reader = csv.reader(file)
-        next(reader)  # skip titles
+            if row[7]:  # Check for valid filepath (row[7])
+                doc = False  # Used to check if file loaded successfully
+                total_count += 1  # Total file count includes before
 
-        with alive_bar(num_lines) as bar:  # Initiliaze progress bar
-            bar.text("Verifying files")
+                # Attempt reading of file via Pymupdf (fitz), straight from its zip if from_zips
+                try:
+                    doc = docstore.Open(row[7])
+                except (zipfile.BadZipFile, KeyError):
+                    continue
+                except UnicodeDecodeError:
+                    continue
+                except PdfReadError:
+                    continue
+                except pymupdf.EmptyFileError:
+                    continue
+                except pymupdf.FileDataError:
+                    continue
 
-            for row in reader:
+                # Before check all variables must be None for each file
+                doctype_confirmed = "None"
+                name_confirmed = "None"
+                year_confirmed = "None"
 
-                if row[7]:  # Check for valid filepath (row[7])
-                    doc = False  # Used to check if file loaded successfully
-                    total_count += 1  # Total file count includes before
+                if doc:  # Check for successful load
+                    found_count += 1
 
-                    # Attempt reading of file via Pymupdf (fitz)
+                    # Attempt fuzzymatching across all pages of doc
                     try:
-                        doc = fitz.open(row[7])
-                    except UnicodeDecodeError:
-                        continue
-                    except PdfReadError:
-                        continue
-                    except pymupdf.EmptyFileError:
-                        continue
-                    except pymupdf.FileDataError:
+                        for page in doc:
+
+                            # Check for a complete profile, if not, check will resume
+                            if not (
+                                doctype_confirmed != "None"
+                                and name_confirmed != "None"
+                                and year_confirmed != "None"
+                            ):
+                                text = page.get_text().split(
+                                    "\n"
+                                )  # Seperates paragraph into list of individual words
+
+                                results = VerifyAppearances(
+                                    text,
+                                    doctype_confirmed,
+                                    row[2],
+                                    name_confirmed,
+                                    row[4],
+                                    year_confirmed,
+                                )
+
+                                doctype_confirmed = results[0]
+                                name_confirmed = results[1]
+                                year_confirmed = results[2]
+
+                            else:
+                                break
+
+                    except pymupdf.mupdf.FzErrorFormat:
                         continue
 
-                    # Before check all variables must be None for each file
-                    doctype_confirmed = "None"
-                    name_confirmed = "None"
-                    year_confirmed = "None"
-
-                    if doc:  # Check for successful load
-                        found_count += 1
-
-                        # Attempt fuzzymatching across all pages of doc
-                        try:
-                            for page in doc:
-
-                                # Check for a complete profile, if not, check will resume
-                                if not (
-                                    doctype_confirmed != "None"
-                                    and name_confirmed != "None"
-                                    and year_confirmed != "None"
-                                ):
-                                    text = page.get_text().split(
-                                        "\n"
-                                    )  # Seperates paragraph into list of individual words
-
-                                    results = VerifyAppearances(
-                                        text,
-                                        doctype_confirmed,
-                                        row[2],
-                                        name_confirmed,
-                                        row[4],
-                                        year_confirmed,
-                                    )
-
-                                    doctype_confirmed = results[0]
-                                    name_confirmed = results[1]
-                                    year_confirmed = results[2]
-
-                                else:
-                                    break
-
-                        except pymupdf.mupdf.FzErrorFormat:
-                            continue
-
-                        missing_index = GetMissingIndex(row[1], row[2], row[5], occs)
-                        TypesAppend(
-                            row[7],
-                            row[1],
-                            row[2],
-                            row[3],
-                            row[4],
-                            doctype_confirmed,
-                            name_confirmed,
-                            year_confirmed,
-                            missing_index,
-                        )
-                        occs.append(missing_index)  # Index is now verifiably occupied
+                    missing_index = GetMissingIndex(row[1], row[2], row[5], occs)
+                    TypesAppend(
+                        row[7],
+                        row[1],
+                        row[2],
+                        row[3],
+                        row[4],
+                        doctype_confirmed,
+                        name_confirmed,
+                        year_confirmed,
+                        missing_index,
+                    )
+                    occs.add(missing_index)  # Index is now verifiably occupied
 
-                bar()
+            bar()
+
+    runstate.Commit()
+    runstate.ExportCsv("confirmations")
 
     if total_count != 0:
         print(
@@ -683,46 +653,43 @@ def PrintStatistics():
 
     scan_count = 0
 
-    with open("confirmations.csv", "r", newline="") as file:
-        reader = csv.reader(file)
-
-        doc_verified = 0
-        name_verified = 0
-        name_exacts = 0
-        year_verified = 0
-        year_exacts = 0
-        true_count = 0
+    doc_verified = 0
+    name_verified = 0
+    name_exacts = 0
+    year_verified = 0
+    year_exacts = 0
+    true_count = 0
 
-        for row in reader:
+    for row in runstate.Rows("confirmations"):
 
-            all = True  # Toggle to see if a conditional fails
+        all = True  # Toggle to see if a conditional fails
 
-            if str(row[5]) != "None":  # row[5] is doctype predition col
-                doc_verified += 1
-            else:
-                all = False
+        if str(row[5]) != "None":  # row[5] is doctype predition col
+            doc_verified += 1
+        else:
+            all = False
 
-            if str(row[6]) != "None":  # row[6] is name prediction col
-                name_verified += 1
-                if str(row[6]) == str(row[3]):  # row[3] is exact desired name from HH
-                    name_exacts += 1
-            else:
-                all = False
+        if str(row[6]) != "None":  # row[6] is name prediction col
+            name_verified += 1
+            if str(row[6]) == str(row[3]):  # row[3] is exact desired name from HH
+                name_exacts += 1
+        else:
+            all = False
 
-            if str(row[7]) != "None":  # row[7] is year prediction col
-                year_verified += 1
-                if str(row[7] == row[4]):  # row[4] is exact desired year
-                    year_exacts += 1
-            else:
-                all = False
+        if str(row[7]) != "None":  # row[7] is year prediction col
+            year_verified += 1
+            if str(row[7] == row[4]):  # row[4] is exact desired year
+                year_exacts += 1
+        else:
+            all = False
 
-            if (
-                all == True
-            ):  # If program reaches this line after 3 conditionals and all isnt toggled off, all targeted columns will have values
-                true_count += 1
+        if (
+            all == True
+        ):  # If program reaches this line after 3 conditionals and all isnt toggled off, all targeted columns will have values
+            true_count += 1
 
-            # Total scanned docs
-            scan_count += 1
+        # Total scanned docs
+        scan_count += 1
 
     print(str((true_count / scan_count) * 100) + "% have all three fields verified\n")
     print(str((doc_verified / scan_count) * 100) + "% of files are annual reports\n")
@@ -748,14 +715,10 @@ def CountMatches():
     total = 0
     matches = 0
 
-    with open("confirmations.csv", "r", newline="") as file:
-        reader = csv.reader(file)
-        next(reader)
-
-        for row in reader:
-            if row[8] != "NA":  # Only outcomes are NA or an index
-                matches += 1
-            total += 1
+    for row in runstate.Rows("confirmations"):
+        if row[8] != "NA":  # Only outcomes are NA or an index
+            matches += 1
+        total += 1
 
     return total, matches
 
@@ -765,7 +728,8 @@ def main():
     InitializeFiles()
     x = 0
     while x < 1:
-        UnzipFiles()
+        if not docstore.from_zips:
+            UnzipFiles()
         OpenTrackers()
         ValidateMatches()
         if x == 0:
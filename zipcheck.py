@@ -0,0 +1,108 @@
+"""
+Background integrity check of downloaded zips
+
+Each zip moved into /zips is handed to a small thread pool that reads its central directory and
+checks the CRC of every member (ZipFile.testzip), so truncated or corrupt downloads are found while
+the run is still going instead of being skipped later by verifyscript's UnzipFiles. Submit never
+waits; bad zips are collected with whatever the caller needs to download them again.
+"""
+
+import threading
+import time
+import zipfile
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+
+pool = ThreadPoolExecutor(max_workers=2)  # decompression releases the GIL, scraping is not slowed
+lock = threading.Lock()
+
+pending = []  # futures of checks not yet waited on
+bad = []  # (path, job, error) of zips that failed
+checked = [0, 0, 0.0]  # zips checked, bytes read, seconds spent
+
+
+def Verify(path):
+    """
+    Reads every member of a zip, checking its CRC
+
+    path -- zip path
+    Return: string describing the problem, None if the zip is sound
+    """
+    try:
+        with zipfile.ZipFile(path) as zip:
+            name = zip.testzip()
+        if name is not None:
+            return "bad CRC in " + name
+        return None
+    except (zipfile.BadZipFile, zlib.error, EOFError, OSError) as error:
+        return type(error).__name__ + ": " + str(error)
+
+
+def Check(path, job, size):
+    """
+    Verifies a zip on the pool, recording it in bad if it fails
+
+    Return: void
+    """
+    start = time.monotonic()
+    error = Verify(path)
+    with lock:
+        checked[0] += 1
+        checked[1] += size
+        checked[2] += time.monotonic() - start
+        if error is not None:
+            bad.append((path, job, error))
+
+
+def Submit(path, job=None, size=0):
+    """
+    Queues a zip for checking and returns at once
+
+    path -- zip path
+    job -- anything the caller needs to download the zip again, returned by TakeBad
+    size -- bytes, for the report
+    Return: void
+    """
+    future = pool.submit(Check, path, job, size)
+    with lock:
+        pending.append(future)
+        pending[:] = [future for future in pending if not future.done()]
+
+
+def Wait():
+    """
+    Waits for every submitted check to finish
+
+    Return: void
+    """
+    with lock:
+        futures = list(pending)
+        pending.clear()
+    for future in futures:
+        future.result()
+
+
+def TakeBad():
+    """
+    Return: list of (path, job, error) found since the last call
+    """
+    with lock:
+        ret = list(bad)
+        bad.clear()
+    return ret
+
+
+def Report():
+    """
+    Return: string summary of the checks made
+    """
+    with lock:
+        count, size, seconds = checked
+    return (
+        str(count)
+        + " zips checked, "
+        + str(round(size / 1000000.0, 1))
+        + "MB in "
+        + str(round(seconds, 1))
+        + "s of background time"
+    )